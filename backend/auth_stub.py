@@ -0,0 +1,38 @@
+"""Local stand-in for the Emergent OAuth session-data endpoint.
+
+Lets the /api/auth/session path run offline (e.g. under load tests):
+
+    uvicorn auth_stub:app --port 8002
+    EMERGENT_AUTH_URL=http://localhost:8002/auth/v1/env/oauth/session-data
+
+Any X-Session-ID is accepted and mapped to a stable fake user; an ID
+starting with "invalid" gets a 401. AUTH_STUB_LATENCY adds a delay in
+seconds to simulate a slow provider.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+
+from fastapi import FastAPI, Header, HTTPException
+
+app = FastAPI()
+
+LATENCY = float(os.environ.get('AUTH_STUB_LATENCY', '0'))
+
+
+@app.get("/auth/v1/env/oauth/session-data")
+async def session_data(x_session_id: str = Header(...)):
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    if x_session_id.startswith("invalid"):
+        raise HTTPException(status_code=401, detail="Invalid session")
+
+    user_key = hashlib.sha1(x_session_id.encode('utf-8')).hexdigest()[:12]
+    return {
+        "id": user_key,
+        "email": f"user-{user_key}@example.com",
+        "name": f"User {user_key}",
+        "picture": None,
+        "session_token": str(uuid.uuid4())
+    }
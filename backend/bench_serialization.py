@@ -0,0 +1,85 @@
+"""Serialization benchmark for product listings.
+
+Times what happens to a page of products after the query returned, on the
+two paths a route can take:
+
+- validated: FastAPI's response_model validation and serialization, then
+  the stdlib `json` encoder (routes returning raw documents);
+- trusted: construction without validation and orjson
+  (fast_json.trusted_response).
+
+Documents are copies of the seed products shaped like stored ones
+(datetimes, rating histogram), so no database is needed.
+
+    python bench_serialization.py --products 1000 --rounds 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from fast_json import trusted_response
+from seed_data import products as seed_products
+from server import Product
+
+
+def make_documents(count: int) -> List[dict]:
+    created = datetime(2024, 1, 1)
+    docs = []
+    for i in range(count):
+        doc = dict(seed_products[i % len(seed_products)])
+        doc.update({
+            "id": f"{doc['id']}-{i}",
+            "slug": f"{doc['slug']}-{i}",
+            "created_at": created + timedelta(minutes=i),
+            "rating_histogram": {"4": 10, "5": 14},
+            "rating_sum": 108,
+        })
+        docs.append(doc)
+    return docs
+
+
+async def run(count: int, rounds: int):
+    docs = make_documents(count)
+    field = create_response_field(name="Response_get_products", type_=List[Product])
+
+    async def validated() -> bytes:
+        content = await serialize_response(field=field, response_content=docs)
+        return JSONResponse(content).body
+
+    async def trusted() -> bytes:
+        return trusted_response(Product, docs).body
+
+    # Both paths must produce the same document
+    assert json.loads(await validated()) == json.loads(await trusted())
+
+    results = {}
+    for name, path in (("validated", validated), ("trusted", trusted)):
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            await path()
+            timings.append(time.perf_counter() - start)
+        results[name] = timings
+
+    per_1000 = 1000 / count
+    for name, timings in results.items():
+        print(f"{name:>9}: median {statistics.median(timings) * 1000 * per_1000:.2f} ms, "
+              f"min {min(timings) * 1000 * per_1000:.2f} ms per 1000 products")
+    speedup = statistics.median(results["validated"]) / statistics.median(results["trusted"])
+    print(f"speedup: {speedup:.1f}x ({count} products, {rounds} rounds)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare product list serialization paths")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.products, args.rounds))
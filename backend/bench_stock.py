@@ -0,0 +1,110 @@
+"""Concurrency benchmark for stock commits: checks that nothing is oversold.
+
+Creates throwaway products and orders in a separate database (by default
+<DB_NAME>_bench), fires many concurrent multi-line commits at them, replays
+them all (as retried jobs would) and verifies that stock never goes
+negative and that the units sold match the stock consumed exactly.
+
+    python bench_stock.py --orders 2000 --concurrency 200 --stock 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from stock import commit_stock, supports_transactions
+
+
+def database(db_name: Optional[str], force: bool) -> str:
+    # The bench products are not valid catalog products: keep them out of
+    # the application database unless explicitly asked
+    app_db = os.environ['DB_NAME']
+    db_name = db_name or f"{app_db}_bench"
+    if db_name == app_db and not force:
+        raise SystemExit(f"refusing to benchmark in the application database {app_db}: pass another --db, or --force")
+    return db_name
+
+
+async def run(orders: int, concurrency: int, stock: int, products: int, seed: int, db_name: str):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], maxPoolSize=concurrency)
+    db = client[db_name]
+    rng = random.Random(seed)
+    run_id = uuid.uuid4().hex[:8]
+    product_ids = [f"bench-{run_id}-{i}" for i in range(products)]
+
+    await db.products.insert_many([
+        {"id": pid, "slug": pid, "name": pid, "stock": stock} for pid in product_ids
+    ])
+
+    # 1 to 3 lines per order, quantities 1 to 5
+    workload = [
+        [{"product_id": pid, "quantity": rng.randint(1, 5)} for pid in rng.sample(product_ids, rng.randint(1, min(3, products)))]
+        for _ in range(orders)
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+    sold = {pid: 0 for pid in product_ids}
+    committed = 0
+
+    # commit_stock records its outcome on the order
+    order_ids = [f"bench-{run_id}-order-{i}" for i in range(orders)]
+    await db.orders.insert_many([{"id": order_id} for order_id in order_ids])
+
+    async def place(order_id, items):
+        nonlocal committed
+        async with semaphore:
+            if await commit_stock(db, order_id, items):
+                committed += 1
+                for item in items:
+                    sold[item['product_id']] += item['quantity']
+
+    try:
+        mode = "transaction" if await supports_transactions(db) else "compensation"
+        start = time.perf_counter()
+        await asyncio.gather(*(place(order_id, items) for order_id, items in zip(order_ids, workload)))
+        elapsed = time.perf_counter() - start
+
+        # Every order once more, as a retried job would: nothing may change
+        async def replay(order_id, items):
+            async with semaphore:
+                return await commit_stock(db, order_id, items)
+        replayed = sum(await asyncio.gather(*(replay(order_id, items) for order_id, items in zip(order_ids, workload))))
+
+        final = {p['id']: p for p in await db.products.find({"id": {"$in": product_ids}}).to_list(None)}
+        negative = [pid for pid, p in final.items() if p['stock'] < 0]
+        mismatched = [pid for pid, p in final.items() if stock - p['stock'] != sold[pid]]
+        leftover_holds = [pid for pid, p in final.items() if p.get('stock_holds')]
+
+        print(f"mode: {mode}")
+        print(f"orders: {orders}, committed: {committed}, rejected: {orders - committed}")
+        print(f"elapsed: {elapsed:.2f}s, {orders / elapsed:.0f} commits/s at concurrency {concurrency}")
+        print(f"negative stock: {len(negative)}, sold/stock mismatches: {len(mismatched)}, leftover holds: {len(leftover_holds)}")
+        print(f"replayed commits: {replayed} reported committed (expected {committed})")
+        return not (negative or mismatched or leftover_holds or replayed != committed)
+    finally:
+        await db.products.delete_many({"id": {"$in": product_ids}})
+        await db.orders.delete_many({"id": {"$in": order_ids}})
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check stock commits for oversell under concurrency")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=500, help="initial stock per product")
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="database to benchmark in (default: <DB_NAME>_bench)")
+    parser.add_argument("--force", action="store_true", help="allow --db to be the application database")
+    args = parser.parse_args()
+    load_dotenv(Path(__file__).parent / '.env')
+    db_name = database(args.db, args.force)
+    ok = asyncio.run(run(args.orders, args.concurrency, args.stock, args.products, args.seed, db_name))
+    raise SystemExit(0 if ok else 1)
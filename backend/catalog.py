@@ -0,0 +1,193 @@
+"""In-memory columnar snapshot of the product catalog.
+
+The catalog is small and read-heavy, so browsing queries can be answered
+from NumPy column arrays with vectorized masks instead of MongoDB. The
+snapshot is rebuilt lazily when the catalog version is bumped by a product
+write, or when it is older than `max_age` (other workers may have written).
+"""
+import asyncio
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class CatalogSnapshot:
+    def __init__(self, products: List[Dict[str, Any]]):
+        self.products = products
+        self.by_slug = {p['slug']: p for p in products}
+
+        # A missing price becomes NaN
+        self.price = np.array([p.get('price') for p in products], dtype=np.float64)
+        self.rating = np.array([p.get('rating', 0.0) for p in products], dtype=np.float64)
+        self.created_at = np.array([self._timestamp(p.get('created_at')) for p in products], dtype=np.float64)
+        self.stock = np.array([p['stock'] for p in products], dtype=np.int64)
+        self.is_bio = np.array([p.get('is_bio', False) for p in products], dtype=bool)
+        self.featured = np.array([p.get('featured', False) for p in products], dtype=bool)
+        self.category, self.category_codes = self._encode(products, 'category')
+        self.subcategory, self.subcategory_codes = self._encode(products, 'subcategory')
+        self.brand, self.brand_codes = self._encode(products, 'brand')
+
+        # Rank of each product id in sorted order, the keyset tie-breaker
+        self.sorted_ids = np.array(sorted(p['id'] for p in products))
+        self.id_rank = np.searchsorted(self.sorted_ids, np.array([p['id'] for p in products]))
+
+    @staticmethod
+    def _timestamp(value: Any) -> float:
+        """Datetime as epoch seconds; missing values sort first like in MongoDB"""
+        if value is None:
+            return -np.inf
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+
+    @staticmethod
+    def _encode(products: List[Dict[str, Any]], field: str):
+        """Dictionary-encode a string column into int32 codes"""
+        codes: Dict[str, int] = {}
+        column = np.array([codes.setdefault(p[field], len(codes)) for p in products], dtype=np.int32)
+        return column, codes
+
+    def mask(
+        self,
+        category: Optional[str] = None,
+        subcategory: Optional[str] = None,
+        brand: Optional[str] = None,
+        is_bio: Optional[bool] = None,
+        featured: Optional[bool] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> np.ndarray:
+        mask = np.ones(len(self.products), dtype=bool)
+        if category:
+            mask &= self.category == self.category_codes.get(category, -1)
+        if subcategory:
+            mask &= self.subcategory == self.subcategory_codes.get(subcategory, -1)
+        if brand:
+            mask &= self.brand == self.brand_codes.get(brand, -1)
+        if is_bio is not None:
+            mask &= self.is_bio == is_bio
+        if featured is not None:
+            mask &= self.featured == featured
+        if min_price is not None:
+            mask &= self.price >= min_price
+        if max_price is not None:
+            mask &= self.price <= max_price
+        return mask
+
+    def query(
+        self,
+        skip: int = 0,
+        limit: int = 20,
+        sort: Optional[Tuple[str, int]] = None,
+        after: Optional[Tuple[Any, str]] = None,
+        **filters
+    ) -> List[Dict[str, Any]]:
+        """Filtered page of products.
+
+        Without `sort`, products keep catalog (insertion) order. With
+        `sort=(field, direction)`, ties are broken by id, and `after` is the
+        decoded keyset cursor (sort value, id) of the previous page.
+        """
+        mask = self.mask(**filters)
+        if sort is None:
+            return [self.products[i] for i in np.flatnonzero(mask)[skip:skip + limit]]
+
+        field, direction = sort
+        column = getattr(self, field)
+        if after is not None:
+            value, doc_id = after
+            value = self._timestamp(value) if field == 'created_at' else value
+            if direction == 1:
+                id_after = self.id_rank >= np.searchsorted(self.sorted_ids, doc_id, side='right')
+                mask &= (column > value) | ((column == value) & id_after)
+            else:
+                id_before = self.id_rank < np.searchsorted(self.sorted_ids, doc_id, side='left')
+                mask &= (column < value) | ((column == value) & id_before)
+
+        indices = np.flatnonzero(mask)
+        # lexsort uses the last key as the primary one
+        order = np.lexsort((self.id_rank[indices] * direction, column[indices] * direction))
+        return [self.products[i] for i in indices[order][skip:skip + limit]]
+
+    @staticmethod
+    def _counts(column: np.ndarray, mask: np.ndarray, codes: Dict[Any, int]) -> List[Dict[str, Any]]:
+        """Non-zero value counts of a dictionary-encoded column, most frequent first"""
+        counts = np.bincount(column[mask], minlength=len(codes))
+        values = {code: value for value, code in codes.items()}
+        return sorted(
+            ({"value": values[code], "count": int(counts[code])} for code in np.flatnonzero(counts)),
+            key=lambda facet: (-facet["count"], facet["value"])
+        )
+
+    def facets(
+        self,
+        price_boundaries: List[float],
+        skip: int = 0,
+        limit: int = 20,
+        sort: Optional[Tuple[str, int]] = None,
+        **filters
+    ) -> Dict[str, Any]:
+        """Facet counts under the filters plus one page of products"""
+        mask = self.mask(**filters)
+        prices = self.price[mask]
+        # Same buckets as the MongoDB $bucket path: prices that fit no
+        # bucket (negative, NaN, infinite) are counted apart
+        in_range = np.isfinite(prices) & (prices >= price_boundaries[0])
+        price_buckets = np.digitize(prices[in_range], price_boundaries) - 1
+        price_counts = np.bincount(price_buckets, minlength=len(price_boundaries))
+        upper_bounds = price_boundaries[1:] + [None]
+        out_of_range = int((~in_range).sum())
+
+        return {
+            "items": self.query(skip=skip, limit=limit, sort=sort, **filters),
+            "total": int(mask.sum()),
+            "facets": {
+                "category": self._counts(self.category, mask, self.category_codes),
+                "subcategory": self._counts(self.subcategory, mask, self.subcategory_codes),
+                "brand": self._counts(self.brand, mask, self.brand_codes),
+                "is_bio": self._counts(self.is_bio.astype(np.int64), mask, {False: 0, True: 1}),
+                "price": [
+                    {"min": low, "max": high, "count": int(count)}
+                    for low, high, count in zip(price_boundaries, upper_bounds, price_counts)
+                    if count
+                ] + ([{"min": None, "max": None, "count": out_of_range}] if out_of_range else []),
+            },
+        }
+
+
+class CatalogEngine:
+    def __init__(self, db, max_age: float = 30.0):
+        self.db = db
+        self.max_age = max_age
+        self.version = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._snapshot_version = -1
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Mark the snapshot stale; call after any write to `products`"""
+        self.version += 1
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and self._snapshot_version == self.version
+            and time.monotonic() - self._loaded_at < self.max_age
+        )
+
+    async def snapshot(self) -> CatalogSnapshot:
+        if self._is_fresh():
+            return self._snapshot
+
+        async with self._lock:
+            # Another request may have rebuilt it while we waited
+            if not self._is_fresh():
+                version = self.version
+                products = await self.db.products.find({}, {"_id": 0, "applied_reviews": 0}).to_list(None)
+                self._snapshot = CatalogSnapshot(products)
+                self._snapshot_version = version
+                self._loaded_at = time.monotonic()
+        return self._snapshot
@@ -0,0 +1,62 @@
+"""Streaming catalog exports (NDJSON and CSV).
+
+The cursor is consumed in batches of `batch_size` documents and each batch
+is encoded and yielded before the next one is fetched, so memory stays
+constant whatever the size of the catalog.
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List
+
+import orjson
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+async def _batches(cursor, batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    batch = []
+    async for doc in cursor.batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def ndjson_stream(cursor, batch_size: int = 500) -> AsyncIterator[bytes]:
+    async for batch in _batches(cursor, batch_size):
+        yield b"".join(orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE) for doc in batch)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        # images, dangers_ghs
+        return "|".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return orjson.dumps(value).decode()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def csv_stream(cursor, fields: List[str], batch_size: int = 500) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so spreadsheet software detects UTF-8 (accents in names)
+    buffer.write("\ufeff")
+    writer.writerow(fields)
+    async for batch in _batches(cursor, batch_size):
+        writer.writerows([_csv_value(doc.get(field)) for field in fields] for doc in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header of an empty export
+        yield buffer.getvalue().encode()
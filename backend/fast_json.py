@@ -0,0 +1,71 @@
+"""Fast JSON responses for documents read from our own database.
+
+FastAPI validates whatever a route returns against its `response_model`
+and then encodes it with the stdlib `json`; on list endpoints that work
+dominates CPU time, and it is redundant for documents we wrote ourselves.
+`trusted_response` shapes the documents like the model would without
+validating them (same semantics as `model_construct`: undeclared fields
+dropped, defaults filled in, but working on the dicts directly, which is
+several times cheaper than instantiating models) and encodes them with
+orjson. Returning a Response skips FastAPI's validation step, while
+`response_model` on the route still documents the schema.
+
+`FastJSONResponse` is also the app's default response class, so routes
+that still go through validation at least get the faster encoder.
+
+    python bench_serialization.py   # time both paths
+"""
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=_OPTIONS)
+
+
+@lru_cache(maxsize=None)
+def _fields(model: Type[BaseModel]) -> Tuple[Tuple[str, Any, Optional[Callable[[], Any]]], ...]:
+    return tuple((name, field.default, field.default_factory) for name, field in model.model_fields.items())
+
+
+def _shape(fields, doc: Dict[str, Any]) -> Dict[str, Any]:
+    shaped = {}
+    for name, default, default_factory in fields:
+        if name in doc:
+            shaped[name] = doc[name]
+        elif default_factory is not None:
+            shaped[name] = default_factory()
+        elif default is not PydanticUndefined:
+            shaped[name] = default
+    return shaped
+
+
+def construct(model: Type[BaseModel], docs: Union[Dict[str, Any], List[Dict[str, Any]]]):
+    """Trusted documents shaped as `model` would dump them, without validation"""
+    fields = _fields(model)
+    if isinstance(docs, list):
+        return [_shape(fields, doc) for doc in docs]
+    return _shape(fields, docs)
+
+
+def trusted_response(
+    model: Type[BaseModel],
+    docs: Union[Dict[str, Any], List[Dict[str, Any]]],
+    response: Optional[Response] = None
+) -> FastJSONResponse:
+    """Encode database documents as `model` without re-validating them.
+
+    FastAPI ignores headers set on the route's injected `response` when the
+    route returns its own Response, so they are copied over.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return FastJSONResponse(construct(model, docs), headers=headers)
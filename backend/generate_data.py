@@ -0,0 +1,388 @@
+"""Synthetic production-scale dataset for performance work.
+
+Builds on seed_data.py: its categories are inserted as-is and its products
+are the templates for generated ones (subcategory, brand, composition,
+dosage, hazard pictograms, price level). Volumes are configurable and
+everything derives from --seed: the same arguments give the same data,
+and each collection has its own random stream, so changing one volume
+does not reshuffle the others.
+
+Dates are relative to --now (default: today at 00:00 UTC), so runs on the
+same day match; pass --now to reproduce a dataset on another day.
+
+Distributions:
+- product and user activity is Zipf-like: a few products get most of the
+  orders, reviews and carts, a few users place most of the orders;
+- prices are log-normal around the template's price;
+- order and review dates lean towards the recent end of --days;
+- order statuses and review ratings follow typical shop proportions;
+- about 10% of sessions are already expired (exercises the TTL index).
+
+Documents are inserted with unordered `insert_many` batches, several in
+flight at once. Product ratings and sales rollups are then rebuilt from
+the generated reviews and orders, and indexes are created. Every
+generated user has the password `password123` (one precomputed hash).
+
+    python generate_data.py --products 100000 --users 1000000 --orders 5000000 \\
+        --reviews 2000000 --carts 200000 --sessions 500000 --drop
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import math
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from indexes import ensure_indexes
+from ratings import recompute_ratings
+from rollups import backfill
+from seed_data import categories as seed_categories, products as seed_products
+
+SHIPPING_COST = 9.90
+FREE_SHIPPING_THRESHOLD = 150.00
+
+# Collections written by the generator, emptied by --drop
+COLLECTIONS = (
+    "categories", "products", "users", "orders", "reviews", "cart_items",
+    "user_sessions", "rollups", "sales_buckets"
+)
+
+ORDER_STATUSES = (("paid", 55), ("delivered", 22), ("shipped", 10), ("pending", 10), ("cancelled", 3))
+REVIEW_RATINGS = ((5, 45), (4, 30), (3, 12), (2, 6), (1, 7))
+ITEMS_PER_ORDER = ((1, 40), (2, 25), (3, 15), (4, 12), (5, 8))
+
+VARIANTS = ("", "Plus", "Pro", "Max", "Duo", "Eco", "Ultra", "Premium")
+PACKAGINGS = ("250 mL", "1 L", "5 L", "10 L", "20 L", "500 g", "1 kg", "10 kg", "25 kg")
+# Equipment is not sold by volume or weight
+UNPACKAGED_CATEGORIES = {"epi", "materiel"}
+FIRST_NAMES = ("Jean", "Marie", "Pierre", "Sophie", "Luc", "Claire", "Antoine", "Julie", "Nicolas", "Camille",
+               "Thomas", "Élise", "Hugo", "Léa", "Mathieu", "Chloé", "Olivier", "Manon", "Julien", "Inès")
+LAST_NAMES = ("Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau",
+              "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux", "Vincent", "Fournier")
+CITIES = (("Paris", "75001"), ("Lyon", "69001"), ("Toulouse", "31000"), ("Bordeaux", "33000"), ("Nantes", "44000"),
+          ("Reims", "51100"), ("Dijon", "21000"), ("Angers", "49000"), ("Rennes", "35000"), ("Montpellier", "34000"),
+          ("Amiens", "80000"), ("Orléans", "45000"), ("Chartres", "28000"), ("Agen", "47000"), ("Colmar", "68000"))
+REVIEW_COMMENTS = {
+    5: ("Excellent produit, très efficace.", "Résultats visibles en quelques jours.", "Je recommande."),
+    4: ("Bon produit, conforme à la description.", "Efficace, livraison rapide."),
+    3: ("Correct sans plus.", "Efficacité moyenne sur mes parcelles."),
+    2: ("Déçu par les résultats.", "Dosage difficile à respecter."),
+    1: ("Aucun effet constaté.", "Produit arrivé endommagé."),
+}
+
+_NAMESPACE = uuid.UUID("6f1c2a0e-5b7d-4c1e-9a3f-2d8e4b6c0a11")
+
+# bcrypt (cost 12) of "password123", fixed so runs produce identical users
+PASSWORD_HASH = "$2b$12$XaJUAMsMYZ6g1W4znCVYyeQWe/4eRXFT4NQQvSX3SYSSQJRZUAwzi"
+
+
+def stable_id(seed: int, kind: str, index: int) -> str:
+    """Deterministic UUID, so ids can be recomputed from an index instead of stored"""
+    return str(uuid.uuid5(_NAMESPACE, f"{seed}:{kind}:{index}"))
+
+
+def user_name(index: int) -> str:
+    return f"{FIRST_NAMES[index % len(FIRST_NAMES)]} {LAST_NAMES[index // len(FIRST_NAMES) % len(LAST_NAMES)]}"
+
+
+def zipf_cum_weights(n: int, s: float = 1.1) -> List[float]:
+    return list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def pick(rng: random.Random, cum_weights: Sequence[float]) -> int:
+    """Index drawn with the given cumulative weights"""
+    return bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+
+
+def weighted(rng: random.Random, options):
+    values, weights = zip(*options)
+    return rng.choices(values, weights)[0]
+
+
+def recent_date(rng: random.Random, now: datetime, days: int) -> datetime:
+    # Squaring skews towards recent dates (steady growth)
+    return now - timedelta(seconds=days * 86400 * rng.random() ** 2)
+
+
+class BatchWriter:
+    """Buffers documents and inserts them in batches, `concurrency` batches at a time.
+
+    The first failed batch is raised by the next `add` or by `close`.
+    """
+
+    def __init__(self, collection, batch_size: int, concurrency: int):
+        self.collection = collection
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._buffer: List[Dict[str, Any]] = []
+        self._tasks: set = set()
+        self._error: Optional[BaseException] = None
+        self.count = 0
+
+    async def add(self, doc: Dict[str, Any]):
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.batch_size:
+            await self._flush()
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None and self._error is None:
+            self._error = task.exception()
+
+    async def _flush(self):
+        if self._error is not None:
+            raise self._error
+        batch, self._buffer = self._buffer, []
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._insert(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    async def _insert(self, batch: List[Dict[str, Any]]):
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.count += len(batch)
+        finally:
+            self._semaphore.release()
+
+    async def close(self):
+        if self._buffer:
+            await self._flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._error is not None:
+            raise self._error
+
+
+class Generator:
+    def __init__(self, seed: int, products: int, users: int, days: int, now: datetime):
+        self.seed = seed
+        self.products = products
+        self.users = users
+        self.days = days
+        self.now = now
+        self.product_weights = zipf_cum_weights(products)
+        self.user_weights = zipf_cum_weights(users)
+        # Per product: (id, name, price), needed by orders
+        self.catalog: List[tuple] = []
+
+    def rng(self, kind: str) -> random.Random:
+        return random.Random(f"{self.seed}:{kind}")
+
+    def product_docs(self) -> Iterator[Dict[str, Any]]:
+        rng = self.rng("products")
+        templates: Dict[str, List[Dict[str, Any]]] = {}
+        for product in seed_products:
+            templates.setdefault(product['category'], []).append(product)
+        # Categories weighted by how many seed products they have
+        category_ids = [c['id'] for c in seed_categories if c['id'] in templates]
+        category_weights = [len(templates[c]) for c in category_ids]
+
+        for i in range(self.products):
+            category = rng.choices(category_ids, category_weights)[0]
+            template = rng.choice(templates[category])
+            packaging = "" if category in UNPACKAGED_CATEGORIES else rng.choice(PACKAGINGS)
+            name = " ".join(filter(None, (template['name'], rng.choice(VARIANTS), packaging)))
+            price = round(template['price'] * math.exp(rng.gauss(0, 0.5)), 2)
+            product_id = f"gen-{i:07d}"
+            self.catalog.append((product_id, name, price))
+            yield {
+                **{k: template[k] for k in ("category", "subcategory", "brand", "composition", "dosage", "dangers_ghs", "images")},
+                "id": product_id,
+                "name": name,
+                "slug": f"{template['slug']}-{i}",
+                "price": price,
+                "amm_number": f"AMM-{rng.randint(2015, 2024)}-{rng.randint(0, 9999):04d}",
+                "description": template['description'],
+                "stock": int(rng.expovariate(1 / 200)),
+                "is_bio": template['is_bio'] or rng.random() < 0.1,
+                "is_professional_only": template['is_professional_only'],
+                "featured": rng.random() < 0.001,
+                "rating": 0.0,
+                "reviews_count": 0,
+                "rating_histogram": {},
+                "created_at": recent_date(rng, self.now, self.days),
+            }
+
+    def user_docs(self) -> Iterator[Dict[str, Any]]:
+        rng = self.rng("users")
+        for i in range(self.users):
+            professional = rng.random() < 0.3
+            yield {
+                "id": stable_id(self.seed, "user", i),
+                "email": f"user{i}@example.com",
+                "name": user_name(i),
+                "picture": None,
+                "password_hash": PASSWORD_HASH,
+                "is_professional": professional,
+                "is_admin": False,
+                "certificate_number": f"CP-{rng.randint(100000, 999999)}" if professional else None,
+                "created_at": recent_date(rng, self.now, self.days),
+            }
+
+    def order_docs(self, count: int) -> Iterator[Dict[str, Any]]:
+        rng = self.rng("orders")
+        for i in range(count):
+            user = pick(rng, self.user_weights)
+            lines = {}
+            for _ in range(weighted(rng, ITEMS_PER_ORDER)):
+                product = pick(rng, self.product_weights)
+                lines[product] = lines.get(product, 0) + min(int(rng.expovariate(0.6)) + 1, 10)
+            items = [
+                {"product_id": self.catalog[p][0], "product_name": self.catalog[p][1], "quantity": q, "price": self.catalog[p][2]}
+                for p, q in lines.items()
+            ]
+            subtotal = round(sum(item['price'] * item['quantity'] for item in items), 2)
+            shipping_cost = 0.0 if subtotal >= FREE_SHIPPING_THRESHOLD else SHIPPING_COST
+            status = weighted(rng, ORDER_STATUSES)
+            city, postal_code = rng.choice(CITIES)
+            doc = {
+                "id": stable_id(self.seed, "order", i),
+                "user_id": stable_id(self.seed, "user", user),
+                "items": items,
+                "subtotal": subtotal,
+                "shipping_cost": shipping_cost,
+                "total_amount": round(subtotal + shipping_cost, 2),
+                "status": status,
+                "shipping_address": {
+                    "full_name": user_name(user),
+                    "address": f"{rng.randint(1, 200)} rue des Champs",
+                    "city": city,
+                    "postal_code": postal_code,
+                    "country": "France",
+                    "phone": f"06{rng.randint(0, 99999999):08d}",
+                },
+                "payment_session_id": f"cs_gen_{i}",
+                "created_at": recent_date(rng, self.now, self.days),
+            }
+            if status not in ("pending", "cancelled"):
+                # Already reflected in stock; rollups are rebuilt at the end
+                doc["stock_committed"] = True
+            yield doc
+
+    def review_docs(self, count: int) -> Iterator[Dict[str, Any]]:
+        rng = self.rng("reviews")
+        seen = set()
+        produced = 0
+        # One review per (product, user); give up on pairs after repeated collisions
+        while produced < count and len(seen) < self.products * self.users:
+            product, user = pick(rng, self.product_weights), rng.randrange(self.users)
+            key = product * self.users + user
+            if key in seen:
+                continue
+            seen.add(key)
+            rating = weighted(rng, REVIEW_RATINGS)
+            produced += 1
+            yield {
+                "id": stable_id(self.seed, "review", produced),
+                "product_id": self.catalog[product][0],
+                "user_id": stable_id(self.seed, "user", user),
+                "user_name": user_name(user),
+                "rating": rating,
+                "comment": rng.choice(REVIEW_COMMENTS[rating]),
+                "created_at": recent_date(rng, self.now, self.days),
+                # Counted by the ratings rebuild at the end
+                "rating_applied": True,
+            }
+
+    def cart_docs(self, count: int) -> Iterator[Dict[str, Any]]:
+        rng = self.rng("carts")
+        for cart, user in enumerate(rng.sample(range(self.users), min(count, self.users))):
+            products = {pick(rng, self.product_weights) for _ in range(rng.randint(1, 4))}
+            for line, product in enumerate(products):
+                yield {
+                    "id": stable_id(self.seed, "cart_item", cart * 10 + line),
+                    "user_id": stable_id(self.seed, "user", user),
+                    "product_id": self.catalog[product][0],
+                    "quantity": rng.randint(1, 5),
+                    "created_at": self.now - timedelta(hours=rng.random() * 72),
+                }
+
+    def session_docs(self, count: int) -> Iterator[Dict[str, Any]]:
+        rng = self.rng("sessions")
+        for i in range(count):
+            created_at = self.now - timedelta(days=rng.random() * 8)
+            yield {
+                "user_id": stable_id(self.seed, "user", pick(rng, self.user_weights)),
+                "session_token": stable_id(self.seed, "session", i),
+                "expires_at": created_at + timedelta(days=7),
+                "created_at": created_at,
+            }
+
+
+def today() -> datetime:
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_now(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+
+async def load(db, name: str, docs: Iterator[Dict[str, Any]], batch_size: int, concurrency: int) -> int:
+    start = time.perf_counter()
+    writer = BatchWriter(db[name], batch_size, concurrency)
+    for doc in docs:
+        await writer.add(doc)
+    await writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"{name}: {writer.count} documents in {elapsed:.1f}s ({writer.count / elapsed:.0f}/s)")
+    return writer.count
+
+
+async def generate(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], maxPoolSize=max(args.concurrency * 2, 10))
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.drop:
+            for name in COLLECTIONS:
+                # Dropping also removes the indexes: loading is faster without them
+                await db.drop_collection(name)
+
+        gen = Generator(args.seed, args.products, args.users, args.days, args.now)
+        # Same categories as seed_data.py, replaced the same way
+        await db.categories.delete_many({})
+        await db.categories.insert_many([dict(c) for c in seed_categories])
+        await load(db, "products", gen.product_docs(), args.batch_size, args.concurrency)
+        await load(db, "users", gen.user_docs(), args.batch_size, args.concurrency)
+        await load(db, "orders", gen.order_docs(args.orders), args.batch_size, args.concurrency)
+        await load(db, "reviews", gen.review_docs(args.reviews), args.batch_size, args.concurrency)
+        await load(db, "cart_items", gen.cart_docs(args.carts), args.batch_size, args.concurrency)
+        await load(db, "user_sessions", gen.session_docs(args.sessions), args.batch_size, args.concurrency)
+
+        start = time.perf_counter()
+        await ensure_indexes(db)
+        print(f"indexes: {time.perf_counter() - start:.1f}s")
+
+        if not args.skip_derived:
+            start = time.perf_counter()
+            ratings = await recompute_ratings(db)
+            sales = await backfill(db, batch_size=args.batch_size)
+            print(f"derived data: {ratings['reviewed_products']} rated products, {sales['buckets']} sales buckets "
+                  f"in {time.perf_counter() - start:.1f}s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a large synthetic dataset")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--reviews", type=int, default=100000)
+    parser.add_argument("--carts", type=int, default=5000, help="number of users with a cart")
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=730, help="history length")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--now", type=parse_now, default=today(), help="reference date, ISO format (default: today 00:00 UTC)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8, help="insert_many batches in flight")
+    parser.add_argument("--drop", action="store_true", help=f"drop {', '.join(COLLECTIONS)} first (needed to run again)")
+    parser.add_argument("--skip-derived", action="store_true", help="do not rebuild ratings and sales rollups")
+    asyncio.run(generate(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""ETag / conditional GET support for public catalog endpoints.
+
+Responses are cached per URL under the current catalog version, with a
+content-hash ETag. While the version is unchanged, repeat requests are
+answered from the cache (304 if `If-None-Match` matches) without touching
+MongoDB or re-serializing. Content-hash ETags stay valid across workers
+and restarts; entries also expire after `ttl` seconds so writes made by
+another worker are picked up.
+"""
+import hashlib
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import Request, Response
+
+CACHEABLE_PATHS = re.compile(r"^/api/(products(/.*)?|categories|reviews/[^/]+)$")
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same validator
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+class ConditionalGetCache:
+    def __init__(self, version: Callable[[], int], maxsize: int = 2048, ttl: float = 30.0, max_age: int = 0):
+        self.version = version
+        self.cache_control = f"public, max-age={max_age}, must-revalidate"
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _headers(self, etag: str) -> dict:
+        return {"ETag": etag, "Cache-Control": self.cache_control}
+
+    def _reply(self, request: Request, etag: str, body: bytes, headers: Dict[str, str]) -> Response:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=self._headers(etag))
+        return Response(content=body, headers={**headers, **self._headers(etag)})
+
+    async def __call__(self, request: Request, call_next) -> Response:
+        if request.method != "GET" or not CACHEABLE_PATHS.match(request.url.path):
+            return await call_next(request)
+
+        key = (self.version(), request.url.path, request.url.query)
+        entry: Optional[Tuple[str, bytes, Dict[str, str]]] = self._cache.get(key)
+        if entry is not None:
+            return self._reply(request, *entry)
+
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        # Keep handler headers such as content-type and X-Next-Cursor
+        headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "etag", "cache-control")}
+        # Only cache if no write happened while the handler was running
+        if key[0] == self.version():
+            self._cache[key] = (etag, body, headers)
+        return self._reply(request, etag, body, headers)
@@ -0,0 +1,59 @@
+"""Shared async HTTP client for outbound calls.
+
+One pooled `httpx.AsyncClient` is created at startup and reused, so calls
+to external services keep their connections alive and never block the
+event loop. Requests have explicit connect/read timeouts, and idempotent
+ones are retried a bounded number of times on transport errors and 5xx.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundClient:
+    def __init__(
+        self,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.2,
+        max_connections: int = 100
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections // 5 or 1)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("HTTP client not started")
+        return self._client
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """GET with bounded retries and exponential backoff"""
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.get(url, **kwargs)
+                if response.status_code < 500 or attempt == self.retries:
+                    return response
+                logger.warning(f"GET {url} -> {response.status_code}, retrying")
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"GET {url} failed ({e!r}), retrying")
+            await asyncio.sleep(self.backoff * 2 ** attempt)
@@ -0,0 +1,202 @@
+"""MongoDB index registry.
+
+Declares every index the API routes rely on and applies them idempotently.
+Used by the server startup hook and runnable as a standalone script:
+
+    python indexes.py           # create missing indexes
+    python indexes.py --check   # report drift only
+"""
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Collection name -> indexes. Every index carries an explicit name so drift
+# detection does not depend on MongoDB's generated names.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], name="session_token_unique", unique=True),
+        # Per-user session cap: a user's sessions, newest first
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created_at"),
+        # Expired sessions are deleted by MongoDB (expires_at must be a date)
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("slug", ASCENDING)], name="slug_unique", unique=True),
+        IndexModel([("category", ASCENDING), ("subcategory", ASCENDING)], name="category_subcategory"),
+        IndexModel([("featured", ASCENDING)], name="featured"),
+        # Keyset pagination: (sort key, id) for each sort option
+        IndexModel([("price", ASCENDING), ("id", ASCENDING)], name="price_id"),
+        IndexModel([("rating", ASCENDING), ("id", ASCENDING)], name="rating_id"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel([("category", ASCENDING), ("price", ASCENDING), ("id", ASCENDING)], name="category_price_id"),
+        # Full-text search: French stemming, diacritic-insensitive (text index v3)
+        IndexModel(
+            [("name", TEXT), ("brand", TEXT), ("amm_number", TEXT), ("composition", TEXT), ("description", TEXT)],
+            name="search_text",
+            weights={"name": 10, "brand": 6, "amm_number": 6, "composition": 3, "description": 1},
+            default_language="french",
+        ),
+    ],
+    "categories": [
+        IndexModel([("slug", ASCENDING)], name="slug_unique", unique=True),
+    ],
+    "cart_items": [
+        IndexModel([("user_id", ASCENDING), ("product_id", ASCENDING)], name="user_product"),
+        IndexModel([("id", ASCENDING), ("user_id", ASCENDING)], name="id_user"),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_at_id"),
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+    "reviews": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("product_id", ASCENDING), ("user_id", ASCENDING)], name="product_user_unique", unique=True),
+        IndexModel([("product_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="product_created_at_id"),
+    ],
+    "payment_events": [
+        IndexModel([("status", ASCENDING), ("received_at", ASCENDING)], name="status_received_at"),
+    ],
+    "sales_buckets": [
+        IndexModel([("granularity", ASCENDING), ("start", ASCENDING)], name="granularity_start"),
+    ],
+    "token_sessions": [
+        # A login's refresh state is dropped once its last refresh token expires
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "revoked_tokens": [
+        # Entries are dropped once the tokens they revoke have expired
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "jobs": [
+        # Claim query: due queued jobs, and running jobs whose lock expired
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)], name="status_locked_until"),
+        # Finished jobs are kept a week for inspection; failed ones stay until handled
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "payment_transactions": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_unique", unique=True),
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+    ],
+}
+
+# Options that make two indexes with the same keys behave differently
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression", "default_language")
+
+
+def _normalize(spec: dict) -> dict:
+    """Reduce an index document to the fields that matter for drift"""
+    key = dict(spec["key"])
+    normalized = {}
+    if "_fts" in key or TEXT in key.values():
+        # The server stores text indexes as {_fts, _ftsx} plus weights, so
+        # compare the declared text fields through their weights instead
+        weights = dict(spec.get("weights") or {})
+        for field, kind in key.items():
+            if kind == TEXT and field != "_fts":
+                weights.setdefault(field, 1)
+        key = {k: v for k, v in key.items() if v != TEXT and k not in ("_fts", "_ftsx")}
+        normalized["weights"] = weights
+    normalized["key"] = list(key.items())
+    for option in _COMPARED_OPTIONS:
+        if spec.get(option) is not None:
+            normalized[option] = spec[option]
+    if normalized.get("unique") is False:
+        del normalized["unique"]
+    return normalized
+
+
+async def index_drift(db) -> Dict[str, Dict[str, List[str]]]:
+    """Compare declared indexes with the database.
+
+    Returns, per collection, the declared indexes that are missing, the ones
+    whose keys/options differ, and the extra indexes not declared here.
+    """
+    report = {}
+    for collection, models in INDEXES.items():
+        existing = {}
+        async for spec in db[collection].list_indexes():
+            existing[spec["name"]] = _normalize(spec)
+        existing.pop("_id_", None)
+
+        missing, changed = [], []
+        for model in models:
+            declared = model.document
+            name = declared["name"]
+            if name not in existing:
+                missing.append(name)
+            elif existing[name] != _normalize(declared):
+                changed.append(name)
+
+        declared_names = {model.document["name"] for model in models}
+        extra = sorted(set(existing) - declared_names)
+
+        if missing or changed or extra:
+            report[collection] = {"missing": missing, "changed": changed, "extra": extra}
+    return report
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every declared index. Safe to run repeatedly.
+
+    Indexes are created one at a time, so a failure (e.g. duplicate data
+    blocking a unique index, or an existing index with other options) is
+    logged for that index and does not prevent the others from being
+    created. Returns the names of the indexes in place, per collection.
+    """
+    created: Dict[str, List[str]] = {}
+    for collection, models in INDEXES.items():
+        for model in models:
+            try:
+                created.setdefault(collection, []).extend(await db[collection].create_indexes([model]))
+            except OperationFailure as e:
+                logger.error(f"Erreur création index {collection}.{model.document['name']}: {e}")
+    return created
+
+
+async def main(check_only: bool = False):
+    load_dotenv(Path(__file__).parent / '.env')
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if not check_only:
+            created = await ensure_indexes(db)
+            for collection, names in created.items():
+                print(f"{collection}: {', '.join(names)}")
+
+        drift = await index_drift(db)
+        if not drift:
+            print("Indexes up to date")
+        for collection, diff in drift.items():
+            for kind, names in diff.items():
+                if names:
+                    print(f"{collection} {kind}: {', '.join(names)}")
+        return drift
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and check MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="report drift without creating indexes")
+    args = parser.parse_args()
+    drift = asyncio.run(main(check_only=args.check))
+    # Missing or changed indexes are a failure; extra ones are only reported
+    raise SystemExit(1 if any(d["missing"] or d["changed"] for d in drift.values()) else 0)
@@ -0,0 +1,180 @@
+"""Durable background jobs for post-request work.
+
+Jobs are documents in the `jobs` collection, so they survive restarts and
+can be enqueued from anywhere that has the database (routes, scripts).
+Asyncio workers started with the app claim due jobs one at a time, with a
+visibility timeout: a job whose worker died is claimed again once its lock
+expires. Failed jobs are retried with exponential backoff, then parked as
+`failed`. Periodic tasks (sweepers) registered with `periodic` run next to
+the workers.
+
+Handlers must tolerate being run more than once for the same payload.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db,
+        concurrency: int = 4,
+        poll_interval: float = 5.0,
+        visibility_timeout: float = 300.0,
+        max_attempts: int = 5,
+        backoff: float = 2.0
+    ):
+        self.db = db
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._handlers: Dict[str, Handler] = {}
+        self._periodic: List[Tuple[Callable[[], Awaitable[None]], float]] = []
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def handler(self, name: str):
+        """Decorator registering the coroutine that runs jobs called `name`"""
+        def register(fn: Handler) -> Handler:
+            self._handlers[name] = fn
+            return fn
+        return register
+
+    def periodic(self, interval: float):
+        """Decorator registering a coroutine run at start, then every `interval` seconds"""
+        def register(fn: Callable[[], Awaitable[None]]):
+            self._periodic.append((fn, interval))
+            return fn
+        return register
+
+    async def enqueue(
+        self,
+        name: str,
+        payload: Dict[str, Any],
+        delay: float = 0.0,
+        dedupe_key: Optional[str] = None,
+        retry_failed: bool = False
+    ) -> str:
+        """Persist a job. With `dedupe_key`, enqueuing the same key twice is a
+        no-op, unless `retry_failed` and the existing job has failed: it is
+        then queued again with a fresh attempt count."""
+        now = datetime.now(timezone.utc)
+        job_id = dedupe_key or str(uuid.uuid4())
+        try:
+            await self.db.jobs.insert_one({
+                "_id": job_id,
+                "name": name,
+                "payload": payload,
+                "status": "queued",
+                "attempts": 0,
+                "run_at": now + timedelta(seconds=delay),
+                "created_at": now
+            })
+        except DuplicateKeyError:
+            if not retry_failed:
+                return job_id
+            result = await self.db.jobs.update_one(
+                {"_id": job_id, "status": "failed"},
+                {"$set": {"status": "queued", "attempts": 0, "run_at": now + timedelta(seconds=delay)}}
+            )
+            if not result.modified_count:
+                return job_id
+        self._wakeup.set()
+        return job_id
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        return await self.db.jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "locked_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {"status": "running", "locked_until": now + timedelta(seconds=self.visibility_timeout)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _execute(self, job: Dict[str, Any]):
+        handler = self._handlers.get(job["name"])
+        try:
+            if handler is None:
+                raise RuntimeError(f"no handler for job {job['name']}")
+            await handler(job["payload"])
+        except Exception as e:
+            logger.error(f"Erreur job {job['name']} {job['_id']}: {e}")
+            if job["attempts"] >= self.max_attempts:
+                update = {"status": "failed", "last_error": str(e)}
+            else:
+                retry_at = datetime.now(timezone.utc) + timedelta(seconds=self.backoff ** job["attempts"])
+                update = {"status": "queued", "run_at": retry_at, "last_error": str(e)}
+            await self.db.jobs.update_one({"_id": job["_id"]}, {"$set": update})
+            return
+        await self.db.jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc)}, "$unset": {"locked_until": ""}}
+        )
+
+    async def run_pending(self) -> int:
+        """Run due jobs until none is left; returns how many ran"""
+        count = 0
+        while True:
+            job = await self._claim()
+            if job is None:
+                return count
+            await self._execute(job)
+            count += 1
+
+    async def _worker(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                if await self.run_pending() == 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur worker jobs: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _run_periodic(self, fn: Callable[[], Awaitable[None]], interval: float):
+        while True:
+            try:
+                await fn()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur tâche périodique {fn.__name__}: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            self._tasks += [asyncio.create_task(self._run_periodic(fn, interval)) for fn, interval in self._periodic]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stats(self) -> Dict[str, int]:
+        rows = await self.db.jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+        return {row["_id"]: row["count"] for row in rows}
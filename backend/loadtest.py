@@ -0,0 +1,434 @@
+"""End-to-end load test: scripted user journeys against the running API.
+
+Virtual users run weighted journeys in a loop for --duration seconds:
+
+- browse: listing, category filter, sorted pages, search, facets;
+- product: product page and its reviews;
+- cart: add to cart, cart summary;
+- checkout: add to cart, create order, payment status (fake provider);
+- admin: dashboard stats and sales analytics.
+
+Latencies are recorded per route template and reported as p50/p95/p99,
+mean, max, RPS and error counts, printed and written as JSON (--output) so
+releases can be compared (--compare, non-zero exit on a p95 regression).
+
+Without --base-url the app is started with uvicorn against MONGO_URL and
+--db, with the fake payment provider and a low bcrypt cost. --db defaults
+to a throwaway `<DB_NAME>_loadtest` database, which needs a catalog
+(seed_data.py or generate_data.py); the application database itself is
+refused without --force. Users created by the run, with their sessions,
+carts, orders and payments, are deleted at exit (stock of their orders is
+given back and sales rollups are rebuilt) unless --keep-data is given.
+A server given with --base-url must accept http://loadtest.local as
+checkout origin (CHECKOUT_ORIGINS); the run fails if no order is created:
+
+    DB_NAME=shop_loadtest python generate_data.py --products 10000 --drop
+    python loadtest.py --users 50 --duration 60 --output baseline.json
+    python loadtest.py --users 50 --duration 60 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+
+JOURNEYS = (("browse", 40), ("product", 30), ("cart", 15), ("checkout", 10), ("admin", 5))
+
+# origin_url of the checkout journey; the started server accepts it
+CHECKOUT_ORIGIN = "http://loadtest.local"
+
+SHIPPING_ADDRESS = {
+    "full_name": "Test Charge",
+    "address": "1 rue des Champs",
+    "city": "Reims",
+    "postal_code": "51100",
+    "country": "France",
+    "phone": "0600000000",
+}
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.successes: Dict[str, int] = {}
+        self.client_errors: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.recording = False
+
+    def record(self, route: str, elapsed: float, status: Optional[int]):
+        if not self.recording:
+            return
+        self.latencies.setdefault(route, []).append(elapsed)
+        if status is None or status >= 500:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        elif status >= 400:
+            self.client_errors[route] = self.client_errors.get(route, 0) + 1
+        else:
+            self.successes[route] = self.successes.get(route, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, Dict[str, float]]:
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            routes[route] = {
+                "count": len(values),
+                "rps": round(len(values) / duration, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+                "client_errors": self.client_errors.get(route, 0),
+                "errors": self.errors.get(route, 0),
+            }
+        return routes
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, catalog: Dict[str, Any], rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.catalog = catalog
+        self.rng = rng
+        self.headers: Dict[str, str] = {}
+        self.user_id: Optional[str] = None
+
+    async def call(self, method: str, route: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(f"{method} {route}", time.perf_counter() - start, None)
+            return None
+        self.recorder.record(f"{method} {route}", time.perf_counter() - start, response.status_code)
+        return response
+
+    async def login(self):
+        email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        response = await self.call("POST", "/api/auth/register", "/api/auth/register", json={
+            "email": email, "name": "Charge", "password": "password123"
+        })
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"registration failed: {response.status_code if response else 'no response'}")
+        self.user_id = response.json()['user']['id']
+        self.headers = {"Authorization": f"Bearer {response.json()['session_token']}"}
+
+    def product(self) -> Dict[str, Any]:
+        # Popular products first: a few pages get most of the traffic
+        products = self.catalog["products"]
+        return products[min(int(self.rng.expovariate(5 / len(products))), len(products) - 1)]
+
+    async def browse(self):
+        rng = self.rng
+        await self.call("GET", "/api/products", "/api/products", params={"limit": 20})
+        await self.call("GET", "/api/products", "/api/products", params={"category": rng.choice(self.catalog["categories"]), "limit": 20})
+        page = await self.call("GET", "/api/products?sort", "/api/products", params={"sort": rng.choice(["price", "-price", "-rating"]), "limit": 20})
+        if page is not None and page.headers.get("X-Next-Cursor"):
+            await self.call("GET", "/api/products?sort", "/api/products", params={
+                "sort": page.request.url.params["sort"], "cursor": page.headers["X-Next-Cursor"], "limit": 20
+            })
+        await self.call("GET", "/api/products?search", "/api/products", params={"search": rng.choice(self.catalog["terms"]), "limit": 20})
+        await self.call("GET", "/api/products/facets", "/api/products/facets", params={"category": rng.choice(self.catalog["categories"])})
+        await self.call("GET", "/api/categories", "/api/categories")
+
+    async def product_page(self):
+        product = self.product()
+        await self.call("GET", "/api/products/{slug}", f"/api/products/{product['slug']}")
+        await self.call("GET", "/api/reviews/{product_id}", f"/api/reviews/{product['id']}", params={"limit": 20})
+        await self.call("GET", "/api/products/featured", "/api/products/featured")
+
+    async def cart(self):
+        await self.call("POST", "/api/cart/add", "/api/cart/add", json={"product_id": self.product()["id"], "quantity": 1})
+        await self.call("GET", "/api/cart/summary", "/api/cart/summary")
+
+    async def checkout(self):
+        for _ in range(self.rng.randint(1, 3)):
+            await self.call("POST", "/api/cart/add", "/api/cart/add", json={"product_id": self.product()["id"], "quantity": 1})
+        order = await self.call("POST", "/api/checkout/create-order", "/api/checkout/create-order", json={
+            "shipping_address": SHIPPING_ADDRESS, "origin_url": CHECKOUT_ORIGIN
+        })
+        if order is not None and order.status_code == 200:
+            session_id = order.json()["session_id"]
+            await self.call("GET", "/api/checkout/status/{session_id}", f"/api/checkout/status/{session_id}")
+        await self.call("GET", "/api/orders", "/api/orders", params={"limit": 20})
+
+    async def admin(self, admin_headers: Dict[str, str]):
+        headers, self.headers = self.headers, admin_headers
+        try:
+            await self.call("GET", "/api/admin/stats", "/api/admin/stats")
+            await self.call("GET", "/api/admin/analytics/sales", "/api/admin/analytics/sales", params={"granularity": "day"})
+        finally:
+            self.headers = headers
+
+    async def run(self, deadline: float, admin_headers: Dict[str, str]):
+        names, weights = zip(*JOURNEYS)
+        while time.monotonic() < deadline:
+            journey = self.rng.choices(names, weights)[0]
+            if journey == "browse":
+                await self.browse()
+            elif journey == "product":
+                await self.product_page()
+            elif journey == "cart":
+                await self.cart()
+            elif journey == "checkout":
+                await self.checkout()
+            else:
+                await self.admin(admin_headers)
+
+
+async def load_catalog(client: httpx.AsyncClient) -> Dict[str, Any]:
+    products = (await client.get("/api/products", params={"limit": 500})).json()
+    categories = [c["slug"] for c in (await client.get("/api/categories")).json()]
+    if not products or not categories:
+        raise RuntimeError("empty catalog: run seed_data.py or generate_data.py first")
+    terms = sorted({word for p in products for word in p["name"].split() if len(word) > 4})
+    return {
+        "products": [{"id": p["id"], "slug": p["slug"]} for p in products],
+        "categories": categories,
+        "terms": terms[:200] or ["produit"],
+    }
+
+
+async def make_admin(client: httpx.AsyncClient, db_name: str, user_ids: List[str]) -> Dict[str, str]:
+    """Headers of a fresh admin user: registered through the API, promoted in
+    the database, then logged in so the new token carries the admin flag"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    credentials = {"email": f"load-admin-{uuid.uuid4().hex[:12]}@example.com", "password": "password123"}
+    response = await client.post("/api/auth/register", json={**credentials, "name": "Admin charge"})
+    response.raise_for_status()
+    user_ids.append(response.json()['user']['id'])
+
+    mongo = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        await mongo[db_name].users.update_one({"email": credentials["email"]}, {"$set": {"is_admin": True}})
+    finally:
+        mongo.close()
+
+    response = await client.post("/api/auth/login", json=credentials)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['session_token']}"}
+
+
+async def cleanup(db_name: str, user_ids: List[str]) -> Dict[str, int]:
+    """Delete what the run created for `user_ids`; returns deleted counts"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import UpdateOne
+    from ratings import recompute_ratings
+    from rollups import backfill
+
+    mongo = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = mongo[db_name]
+    owned = {"user_id": {"$in": user_ids}}
+    try:
+        # Give back the stock taken by the run's paid orders
+        restock: Dict[str, int] = {}
+        order_ids = []
+        async for order in db.orders.find(owned, {"_id": 0, "id": 1, "items": 1, "stock_committed": 1}):
+            order_ids.append(order['id'])
+            if order.get('stock_committed'):
+                for item in order['items']:
+                    restock[item['product_id']] = restock.get(item['product_id'], 0) + item['quantity']
+        if restock:
+            await db.products.bulk_write([
+                UpdateOne({"id": product_id}, {"$inc": {"stock": quantity}}) for product_id, quantity in restock.items()
+            ], ordered=False)
+
+        deleted = {}
+        for name in ("user_sessions", "token_sessions", "cart_items", "orders", "payment_transactions", "reviews"):
+            deleted[name] = (await db[name].delete_many(owned)).deleted_count
+        deleted["users"] = (await db.users.delete_many({"id": {"$in": user_ids}})).deleted_count
+        deleted["jobs"] = (await db.jobs.delete_many({"payload.order_id": {"$in": order_ids}})).deleted_count
+
+        # Aggregates that counted the deleted documents
+        if deleted["orders"]:
+            await backfill(db)
+        if deleted["reviews"]:
+            await recompute_ratings(db, reset_missing=True)
+        return deleted
+    finally:
+        mongo.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, db_name: str, workers: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DB_NAME": db_name,
+        "PAYMENT_PROVIDER": "fake",
+        "BCRYPT_ROUNDS": "4",
+        "AUTH_MODE": os.environ.get("AUTH_MODE", "session"),
+        "CHECKOUT_ORIGINS": CHECKOUT_ORIGIN,
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT_DIR, env=env
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/categories")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("server did not start")
+
+
+def database(args) -> str:
+    app_db = os.environ['DB_NAME']
+    if args.base_url is not None and args.db is None:
+        raise SystemExit("--db is required with --base-url: the database of that server")
+    db_name = args.db or f"{app_db}_loadtest"
+    if db_name == app_db and not args.force:
+        raise SystemExit(f"refusing to load test the application database {app_db}: pass another --db, or --force")
+    return db_name
+
+
+async def run(args) -> Dict[str, Any]:
+    load_dotenv(ROOT_DIR / '.env')
+    db_name = database(args)
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        port = free_port()
+        server = start_server(port, db_name, args.workers)
+        base_url = f"http://127.0.0.1:{port}"
+
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    user_ids: List[str] = []
+    users: List[VirtualUser] = []
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+            await wait_ready(client)
+            catalog = await load_catalog(client)
+            admin_headers = await make_admin(client, db_name, user_ids)
+
+            recorder = Recorder()
+            users = [VirtualUser(client, recorder, catalog, random.Random(args.seed + i)) for i in range(args.users)]
+            await asyncio.gather(*(user.login() for user in users))
+
+            # Warm-up: caches, snapshot and connection pools are not measured
+            await asyncio.gather(*(user.run(time.monotonic() + args.warmup, admin_headers) for user in users))
+
+            recorder.recording = True
+            start = time.monotonic()
+            await asyncio.gather(*(user.run(start + args.duration, admin_headers) for user in users))
+            duration = time.monotonic() - start
+            recorder.recording = False
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        user_ids += [user.user_id for user in users if user.user_id]
+        if user_ids and not args.keep_data:
+            deleted = await cleanup(db_name, user_ids)
+            print(f"cleanup: {', '.join(f'{count} {name}' for name, count in deleted.items())}")
+
+    # A checkout refused by the server (e.g. origin not allowed) is only a
+    # 4xx: without any paid path the checkout routes would measure nothing
+    if not recorder.successes.get("POST /api/checkout/create-order"):
+        raise SystemExit(
+            f"no checkout/create-order call succeeded: the server must accept origin {CHECKOUT_ORIGIN} (CHECKOUT_ORIGINS)"
+        )
+
+    routes = recorder.summary(duration)
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "users": args.users, "duration": args.duration, "warmup": args.warmup,
+            "workers": args.workers if args.base_url is None else None, "seed": args.seed,
+            "auth_mode": os.environ.get("AUTH_MODE", "session"), "python": platform.python_version(),
+        },
+        "total": {
+            "count": sum(r["count"] for r in routes.values()),
+            "rps": round(sum(r["count"] for r in routes.values()) / duration, 2),
+            "errors": sum(r["errors"] for r in routes.values()),
+        },
+        "routes": routes,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'route':<44} {'count':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'4xx':>5} {'err':>5}")
+    for route, r in report["routes"].items():
+        print(f"{route:<44} {r['count']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['client_errors']:>5} {r['errors']:>5}")
+    total = report["total"]
+    print(f"total: {total['count']} requests, {total['rps']:.1f} req/s, {total['errors']} errors (latencies in ms)")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> bool:
+    """Print p95/RPS changes against a baseline; False if a route's p95 regressed too much"""
+    ok = True
+    print(f"\n{'route':<44} {'p95 before':>11} {'p95 after':>10} {'change':>8}")
+    for route, r in report["routes"].items():
+        before = baseline["routes"].get(route)
+        if before is None or not before["p95_ms"]:
+            continue
+        change = r["p95_ms"] / before["p95_ms"] - 1
+        flag = ""
+        if change > max_regression:
+            ok = False
+            flag = "  REGRESSION"
+        print(f"{route:<44} {before['p95_ms']:>11.1f} {r['p95_ms']:>10.1f} {change:>+8.0%}{flag}")
+    rps_change = report["total"]["rps"] / baseline["total"]["rps"] - 1 if baseline["total"]["rps"] else 0
+    print(f"total rps: {baseline['total']['rps']:.1f} -> {report['total']['rps']:.1f} ({rps_change:+.0%})")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the API with scripted user journeys")
+    parser.add_argument("--base-url", help="test a running server instead of starting one")
+    parser.add_argument("--db", help="database of the server (default: <DB_NAME>_loadtest; required with --base-url)")
+    parser.add_argument("--force", action="store_true", help="allow --db to be the application database")
+    parser.add_argument("--keep-data", action="store_true", help="keep the users, orders and carts created by the run")
+    # The fake provider keeps checkout sessions in memory: with several
+    # workers, a status call can land on a worker that does not know it
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the started server")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="baseline JSON report to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 increase per route (0.2 = +20%%)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        ok = compare(report, json.loads(Path(args.compare).read_text()), args.max_regression)
+        raise SystemExit(0 if ok else 1)
@@ -0,0 +1,74 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe token holding the sort key value and the
+`id` of the last document of a page. The next page is selected with a
+range condition on (sort key, id), which an index on the same fields
+answers without skipping, so deep pages cost the same as the first one.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+# Sort options accepted by list endpoints ("-" prefix = descending)
+PRODUCT_SORTS = ("price", "-price", "rating", "-rating", "created_at", "-created_at")
+
+
+def parse_sort(sort: str) -> Tuple[str, int]:
+    if sort.startswith('-'):
+        return sort[1:], -1
+    return sort, 1
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return {"$dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def encode_cursor(sort_value: Any, doc_id: str) -> str:
+    raw = json.dumps([_encode_value(sort_value), doc_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return _decode_value(sort_value), str(doc_id)
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+
+def keyset_filter(field: str, direction: int, cursor: str) -> Dict[str, Any]:
+    """Mongo condition selecting documents after the cursor in (field, id) order"""
+    value, doc_id = decode_cursor(cursor)
+    op = "$gt" if direction == 1 else "$lt"
+    if value is None:
+        # Missing values sort first; range operators never match null
+        if direction == 1:
+            return {"$or": [{field: {"$ne": None}}, {field: None, "id": {op: doc_id}}]}
+        return {field: None, "id": {op: doc_id}}
+    after = [{field: {op: value}}, {field: value, "id": {op: doc_id}}]
+    if direction == -1:
+        # Missing values sort last in descending order
+        after.append({field: None})
+    return {"$or": after}
+
+
+def next_cursor(docs: List[Dict[str, Any]], field: str, limit: int) -> Optional[str]:
+    """Cursor for the page after `docs`, or None if this was the last page"""
+    if len(docs) < limit or not docs:
+        return None
+    last = docs[-1]
+    return encode_cursor(last.get(field), last['id'])
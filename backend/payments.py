@@ -0,0 +1,191 @@
+"""Payment provider adapters.
+
+Checkout routes talk to a single long-lived `PaymentProvider` built at
+startup instead of constructing a Stripe client per request. Every
+provider call has a timeout and its latency is recorded per operation.
+
+`FakePaymentProvider` completes payments locally, so the full checkout
+flow can be benchmarked without reaching Stripe.
+"""
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from cachetools import LRUCache
+from pydantic import BaseModel
+from emergentintegrations.payments.stripe.checkout import (
+    StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+)
+
+
+class PaymentEvent(BaseModel):
+    """Provider-neutral view of a webhook notification"""
+    event_id: Optional[str] = None
+    event_type: Optional[str] = None
+    session_id: Optional[str] = None
+    payment_status: Optional[str] = None
+    metadata: Dict[str, Any] = {}
+
+
+class ProviderMetrics:
+    """Latency of the last `window` calls per provider operation"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._calls: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+
+    def record(self, operation: str, seconds: float, failed: bool):
+        self._latencies.setdefault(operation, deque(maxlen=self.window)).append(seconds)
+        self._calls[operation] = self._calls.get(operation, 0) + 1
+        if failed:
+            self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for operation, latencies in self._latencies.items():
+            ordered = sorted(latencies)
+            pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+            result[operation] = {
+                "calls": self._calls[operation],
+                "errors": self._errors.get(operation, 0),
+                "p50_ms": pick(0.50),
+                "p95_ms": pick(0.95),
+                "p99_ms": pick(0.99),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        return result
+
+
+class PaymentProvider(ABC):
+    name = "base"
+
+    def __init__(self, timeout: float = 15.0):
+        self.timeout = timeout
+        self.metrics = ProviderMetrics()
+
+    async def _timed(self, operation: str, coro):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = await asyncio.wait_for(coro, self.timeout)
+            failed = False
+            return result
+        finally:
+            self.metrics.record(operation, time.perf_counter() - start, failed)
+
+    async def create_checkout_session(self, request: CheckoutSessionRequest, webhook_url: str) -> CheckoutSessionResponse:
+        return await self._timed("create_checkout_session", self._create_checkout_session(request, webhook_url))
+
+    async def get_checkout_status(self, session_id: str) -> CheckoutStatusResponse:
+        return await self._timed("get_checkout_status", self._get_checkout_status(session_id))
+
+    async def handle_webhook(self, body: bytes, signature: Optional[str]) -> PaymentEvent:
+        return await self._timed("handle_webhook", self._handle_webhook(body, signature))
+
+    @abstractmethod
+    async def _create_checkout_session(self, request, webhook_url):
+        ...
+
+    @abstractmethod
+    async def _get_checkout_status(self, session_id):
+        ...
+
+    @abstractmethod
+    async def _handle_webhook(self, body, signature):
+        ...
+
+
+class StripePaymentProvider(PaymentProvider):
+    name = "stripe"
+
+    def __init__(self, api_key: str, timeout: float = 15.0, max_clients: int = 16):
+        super().__init__(timeout)
+        self.api_key = api_key
+        # StripeCheckout is bound to a webhook URL; there are only a few
+        # (one per allowed frontend origin), so keep one long-lived client
+        # each. Bounded in case origins are not restricted.
+        self._clients: LRUCache = LRUCache(maxsize=max_clients)
+
+    def _client(self, webhook_url: str = "") -> StripeCheckout:
+        client = self._clients.get(webhook_url)
+        if client is None:
+            client = self._clients[webhook_url] = StripeCheckout(api_key=self.api_key, webhook_url=webhook_url)
+        return client
+
+    async def _create_checkout_session(self, request, webhook_url):
+        return await self._client(webhook_url).create_checkout_session(request)
+
+    async def _get_checkout_status(self, session_id):
+        return await self._client().get_checkout_status(session_id)
+
+    async def _handle_webhook(self, body, signature):
+        response = await self._client().handle_webhook(body, signature)
+        return PaymentEvent(
+            event_id=getattr(response, "event_id", None),
+            event_type=getattr(response, "event_type", None),
+            session_id=response.session_id,
+            payment_status=response.payment_status,
+            metadata=getattr(response, "metadata", None) or {}
+        )
+
+
+class FakePaymentProvider(PaymentProvider):
+    """In-memory provider: sessions are paid as soon as they are created.
+
+    Webhooks are unsigned JSON bodies: {"id", "session_id", "payment_status"}.
+    """
+    name = "fake"
+
+    def __init__(self, timeout: float = 15.0, latency: float = 0.0):
+        super().__init__(timeout)
+        self.latency = latency
+        self._sessions: Dict[str, CheckoutSessionRequest] = {}
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _create_checkout_session(self, request, webhook_url):
+        await self._delay()
+        session_id = f"cs_fake_{uuid.uuid4().hex}"
+        self._sessions[session_id] = request
+        url = request.success_url.replace("{{CHECKOUT_SESSION_ID}}", session_id).replace("{CHECKOUT_SESSION_ID}", session_id)
+        return CheckoutSessionResponse(url=url, session_id=session_id)
+
+    async def _get_checkout_status(self, session_id):
+        await self._delay()
+        request = self._sessions.get(session_id)
+        if request is None:
+            return CheckoutStatusResponse(status="expired", payment_status="unpaid", amount_total=0, currency="eur", metadata={})
+        return CheckoutStatusResponse(
+            status="complete",
+            payment_status="paid",
+            amount_total=int(round(request.amount * 100)),
+            currency=request.currency,
+            metadata=request.metadata or {}
+        )
+
+    async def _handle_webhook(self, body, signature):
+        await self._delay()
+        data = json.loads(body)
+        return PaymentEvent(
+            event_id=data.get("id"),
+            event_type=data.get("type", "checkout.session.completed"),
+            session_id=data.get("session_id"),
+            payment_status=data.get("payment_status", "paid"),
+            metadata=data.get("metadata") or {}
+        )
+
+
+def create_payment_provider(kind: str, api_key: str, timeout: float = 15.0, fake_latency: float = 0.0) -> PaymentProvider:
+    if kind == "fake":
+        return FakePaymentProvider(timeout=timeout, latency=fake_latency)
+    if kind == "stripe":
+        return StripePaymentProvider(api_key, timeout=timeout)
+    raise ValueError(f"Unknown payment provider: {kind}")
@@ -0,0 +1,182 @@
+"""Bulk product import from CSV or NDJSON.
+
+Rows are read from the uploaded file in chunks, validated one by one
+(`CreateProduct`), and each chunk is upserted by slug in a single
+unordered `bulk_write`. Rows that fail validation, repeat a slug seen
+earlier in the file, or are rejected by MongoDB are reported with their
+line number; the other rows are imported. The CSV layout is the one
+produced by the export endpoint (lists joined with "|").
+"""
+import asyncio
+import csv
+import io
+import time
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, IO, Iterator, List, Tuple, Type
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+FORMATS = ("csv", "ndjson")
+
+MAX_REPORTED_ERRORS = 1000
+
+Row = Tuple[int, Any]
+
+
+def read_ndjson(file: IO[bytes]) -> Iterator[Row]:
+    for line_no, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield line_no, ValueError(f"JSON invalide: {e}")
+
+
+def read_csv(file: IO[bytes], list_fields: Tuple[str, ...]) -> Iterator[Row]:
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    for row in reader:
+        # Empty cells fall back to the model defaults, except for lists
+        doc = {k: v for k, v in row.items() if k and v not in (None, "")}
+        for field in list_fields:
+            if field in doc:
+                doc[field] = doc[field].split("|")
+            elif field in row:
+                doc[field] = []
+        # Header is line 1
+        yield reader.line_num, doc
+
+
+def _list_fields(model: Type[BaseModel]) -> Tuple[str, ...]:
+    return tuple(
+        name for name, field in model.model_fields.items()
+        if getattr(field.annotation, "__origin__", None) is list
+    )
+
+
+def _error_messages(error: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(p) for p in e['loc']) or 'ligne'}: {e['msg']}" for e in error.errors()]
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+
+    def error(self, line: int, messages: List[str]):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": messages})
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self._started
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed else None,
+        }
+
+
+def _upsert(doc: Dict[str, Any], now: datetime) -> UpdateOne:
+    """Create the product, or refresh the catalog fields of an existing one"""
+    return UpdateOne(
+        {"slug": doc["slug"]},
+        {
+            "$set": {**doc, "updated_at": now},
+            "$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "rating": 0.0,
+                "reviews_count": 0,
+                "rating_histogram": {},
+                "created_at": now
+            }
+        },
+        upsert=True
+    )
+
+
+def _prepare_chunk(
+    chunk: List[Row],
+    model: Type[BaseModel],
+    seen_slugs: Dict[str, int],
+    report: ImportReport
+) -> Tuple[List[UpdateOne], List[int]]:
+    """Validate a chunk of rows; returns the upserts and their line numbers"""
+    ops: List[UpdateOne] = []
+    op_lines: List[int] = []
+    now = datetime.now(timezone.utc)
+    for line, raw in chunk:
+        report.rows += 1
+        if isinstance(raw, Exception):
+            report.error(line, [str(raw)])
+            continue
+        if not isinstance(raw, dict):
+            report.error(line, ["ligne: un objet JSON est attendu"])
+            continue
+        try:
+            doc = model(**raw).model_dump()
+        except ValidationError as e:
+            report.error(line, _error_messages(e))
+            continue
+        first = seen_slugs.setdefault(doc["slug"], line)
+        if first != line:
+            report.error(line, [f"slug: déjà présent ligne {first}"])
+            continue
+        ops.append(_upsert(doc, now))
+        op_lines.append(line)
+    return ops, op_lines
+
+
+async def _write_chunk(db, ops: List[UpdateOne], op_lines: List[int], report: ImportReport):
+    try:
+        result = await db.products.bulk_write(ops, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for error in details.get("writeErrors", []):
+            report.error(op_lines[error["index"]], [f"base: {error.get('errmsg', 'erreur')}"])
+    report.inserted += details.get("nUpserted", 0)
+    report.updated += details.get("nMatched", 0)
+
+
+async def import_products(
+    db,
+    file: IO[bytes],
+    format: str,
+    model: Type[BaseModel],
+    chunk_size: int = 1000
+) -> Dict[str, Any]:
+    """Validate and upsert every row of `file`; returns the import report"""
+    rows = read_ndjson(file) if format == "ndjson" else read_csv(file, _list_fields(model))
+    report = ImportReport()
+    seen_slugs: Dict[str, int] = {}
+    loop = asyncio.get_running_loop()
+
+    def next_chunk():
+        return _prepare_chunk(list(islice(rows, chunk_size)), model, seen_slugs, report)
+
+    while True:
+        # Reading and validating is CPU work: keep it off the event loop
+        rows_before = report.rows
+        ops, op_lines = await loop.run_in_executor(None, next_chunk)
+        if report.rows == rows_before:
+            break
+        if ops:
+            await _write_chunk(db, ops, op_lines, report)
+
+    return report.summary()
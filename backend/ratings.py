@@ -0,0 +1,111 @@
+"""Product rating aggregates.
+
+Each product keeps `rating_sum`, `reviews_count` and a per-star
+`rating_histogram`, updated atomically when a review is posted, so the
+cost of a review does not depend on how many the product already has.
+The ids of the last reviews folded in are kept on the product
+(`applied_reviews`), so applying the same review twice counts it once.
+`recompute_ratings` rebuilds the aggregates from `reviews` in bulk:
+
+    python ratings.py                   # repair products that have reviews
+    python ratings.py --reset-missing   # also zero products without reviews
+"""
+import argparse
+import asyncio
+import os
+from pathlib import Path
+from typing import Dict
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+# Review ids kept per product to recognize a review applied twice (a job
+# retried after a crash); only the most recent ones can be retried
+APPLIED_REVIEWS_KEPT = 100
+
+
+async def add_rating(db, product_id: str, rating: int, review_id: str) -> bool:
+    """Fold one new review into the product aggregates in a single atomic update.
+
+    Returns False if the review was already applied (or the product is gone).
+    """
+    # Products created before these counters existed only have the average
+    current_sum = {"$ifNull": ["$rating_sum", {"$multiply": [{"$ifNull": ["$rating", 0]}, {"$ifNull": ["$reviews_count", 0]}]}]}
+    applied = {"$ifNull": ["$applied_reviews", []]}
+    result = await db.products.update_one(
+        {"id": product_id, "applied_reviews": {"$ne": review_id}},
+        [
+            {"$set": {
+                "rating_sum": {"$add": [current_sum, rating]},
+                "reviews_count": {"$add": [{"$ifNull": ["$reviews_count", 0]}, 1]},
+                f"rating_histogram.{rating}": {"$add": [{"$ifNull": [f"$rating_histogram.{rating}", 0]}, 1]},
+                "applied_reviews": {"$concatArrays": [
+                    {"$slice": [applied, -(APPLIED_REVIEWS_KEPT - 1)]}, [review_id]
+                ]}
+            }},
+            {"$set": {"rating": {"$round": [{"$divide": ["$rating_sum", "$reviews_count"]}, 1]}}}
+        ]
+    )
+    return result.modified_count == 1
+
+
+async def recompute_ratings(db, reset_missing: bool = False, batch_size: int = 1000) -> Dict[str, int]:
+    """Rebuild rating aggregates of every product from the reviews collection"""
+    pipeline = [
+        {"$group": {
+            "_id": {"product_id": "$product_id", "rating": "$rating"},
+            "count": {"$sum": 1}
+        }},
+        {"$group": {
+            "_id": "$_id.product_id",
+            "rating_sum": {"$sum": {"$multiply": ["$_id.rating", "$count"]}},
+            "reviews_count": {"$sum": "$count"},
+            "histogram": {"$push": {"k": {"$toString": "$_id.rating"}, "v": "$count"}}
+        }}
+    ]
+
+    updated = 0
+    reviewed = []
+    batch = []
+    async for row in db.reviews.aggregate(pipeline):
+        reviewed.append(row["_id"])
+        batch.append(UpdateOne({"id": row["_id"]}, {"$set": {
+            "rating_sum": row["rating_sum"],
+            "reviews_count": row["reviews_count"],
+            "rating_histogram": {item["k"]: item["v"] for item in row["histogram"]},
+            "rating": round(row["rating_sum"] / row["reviews_count"], 1)
+        }}))
+        if len(batch) >= batch_size:
+            updated += (await db.products.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await db.products.bulk_write(batch, ordered=False)).modified_count
+
+    reset = 0
+    if reset_missing:
+        result = await db.products.update_many(
+            {"id": {"$nin": reviewed}},
+            {"$set": {"rating_sum": 0, "reviews_count": 0, "rating_histogram": {}, "rating": 0.0}}
+        )
+        reset = result.modified_count
+
+    return {"reviewed_products": len(reviewed), "updated": updated, "reset": reset}
+
+
+async def main(reset_missing: bool = False):
+    load_dotenv(Path(__file__).parent / '.env')
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        result = await recompute_ratings(client[os.environ['DB_NAME']], reset_missing=reset_missing)
+        print(f"Products with reviews: {result['reviewed_products']}, updated: {result['updated']}, reset: {result['reset']}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute product ratings from reviews")
+    parser.add_argument("--reset-missing", action="store_true", help="zero the ratings of products without reviews")
+    args = parser.parse_args()
+    asyncio.run(main(reset_missing=args.reset_missing))
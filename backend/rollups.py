@@ -0,0 +1,245 @@
+"""Materialized sales rollups.
+
+Sales figures are maintained as orders become paid, so dashboards read a
+few small documents instead of scanning `orders`:
+
+- `rollups` holds the all-time totals (`sales_totals`);
+- `sales_buckets` holds one document per hour and per day with revenue,
+  order count and units, broken down by product and by category.
+
+Orders are bucketed by their `created_at` and recorded by the order
+finalization job. `backfill` recomputes everything from `orders`; the
+server runs it once per ROLLUPS_VERSION at startup, before its job
+workers record new orders, so orders paid before the rollups existed are
+counted. It can also be run by hand (repair):
+
+    python rollups.py --backfill
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+TOTALS_ID = "sales_totals"
+
+# Records which rollups version was backfilled; bump the version when the
+# rollup documents change shape so they are rebuilt at the next startup
+STATE_ID = "sales_rollups_state"
+ROLLUPS_VERSION = 1
+
+# Order statuses counted as revenue: paid, and everything after payment
+PAID_STATUSES = ["paid", "shipped", "delivered"]
+
+GRANULARITIES = ("hour", "day")
+
+# Recent orders remembered per rollup document to make recording idempotent
+APPLIED_ORDERS_KEPT = 2000
+
+# Paid orders whose finalization job has not run yet: that job records
+# them, so rebuilds leave them out
+COUNTED = {"status": {"$in": PAID_STATUSES}, "finalize_pending": {"$ne": True}}
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_id(start: datetime, granularity: str) -> str:
+    return f"{granularity}:{start.strftime('%Y-%m-%dT%H' if granularity == 'hour' else '%Y-%m-%d')}"
+
+
+def order_increments(order: Dict[str, Any], categories: Dict[str, str]) -> Dict[str, float]:
+    """$inc document for one order; `categories` maps product id -> category"""
+    units = sum(item['quantity'] for item in order['items'])
+    inc = {"revenue": order['total_amount'], "orders": 1, "units": units}
+    for item in order['items']:
+        line_revenue = item['price'] * item['quantity']
+        category = categories.get(item['product_id'], "unknown")
+        for prefix in (f"products.{item['product_id']}", f"categories.{category}"):
+            inc[f"{prefix}.units"] = inc.get(f"{prefix}.units", 0) + item['quantity']
+            inc[f"{prefix}.revenue"] = inc.get(f"{prefix}.revenue", 0) + line_revenue
+    return inc
+
+
+def _applied_once(key: str, order_id: str, update: Dict[str, Any]) -> UpdateOne:
+    """Upsert of a rollup document that applies `update` once per order.
+
+    The order id is pushed to a capped `applied_orders` list in the same
+    write and the filter excludes documents already holding it: a repeated
+    call for a recent order matches nothing and its upsert fails with a
+    duplicate key, which the caller ignores.
+    """
+    return UpdateOne(
+        {"_id": key, "applied_orders": {"$ne": order_id}},
+        {**update, "$push": {"applied_orders": {"$each": [order_id], "$slice": -APPLIED_ORDERS_KEPT}}},
+        upsert=True
+    )
+
+
+async def _write_once(collection, ops: List[UpdateOne]):
+    try:
+        await collection.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+
+async def record_paid_order(db, order: Dict[str, Any]):
+    """Fold a paid order into the rollups.
+
+    Every rollup document records the order in the same write that counts
+    it, so running this again for an order (a retried job) does not count
+    it twice, as long as fewer than APPLIED_ORDERS_KEPT orders were
+    recorded in between.
+    """
+    product_ids = [item['product_id'] for item in order['items']]
+    products = await db.products.find({"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "category": 1}).to_list(None)
+    inc = order_increments(order, {p['id']: p['category'] for p in products})
+
+    bucket_updates = []
+    for granularity in GRANULARITIES:
+        start = bucket_start(order['created_at'], granularity)
+        bucket_updates.append(_applied_once(
+            bucket_id(start, granularity),
+            order['id'],
+            {"$inc": inc, "$setOnInsert": {"granularity": granularity, "start": start}}
+        ))
+
+    await asyncio.gather(
+        _write_once(db.rollups, [_applied_once(
+            TOTALS_ID, order['id'], {"$inc": {"paid_orders": 1, "revenue": order['total_amount']}}
+        )]),
+        _write_once(db.sales_buckets, bucket_updates)
+    )
+
+
+async def rebuild_totals(db) -> Dict[str, Any]:
+    pipeline = [
+        {"$match": COUNTED},
+        {"$group": {"_id": None, "paid_orders": {"$sum": 1}, "revenue": {"$sum": "$total_amount"}}}
+    ]
+    rows = await db.orders.aggregate(pipeline).to_list(1)
+    totals = {"paid_orders": rows[0]["paid_orders"] if rows else 0, "revenue": rows[0]["revenue"] if rows else 0.0}
+    await db.rollups.replace_one({"_id": TOTALS_ID}, totals, upsert=True)
+    return totals
+
+
+async def get_totals(db) -> Dict[str, Any]:
+    totals = await db.rollups.find_one({"_id": TOTALS_ID}, {"_id": 0, "applied_orders": 0})
+    if totals is None:
+        totals = await rebuild_totals(db)
+    return totals
+
+
+async def get_sales_series(
+    db,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    breakdown: bool = False
+) -> List[Dict[str, Any]]:
+    """Buckets in [start, end), oldest first"""
+    projection = {"_id": 0, "granularity": 0, "applied_orders": 0}
+    if not breakdown:
+        projection.update({"products": 0, "categories": 0})
+    query = {"granularity": granularity, "start": {"$gte": bucket_start(start, granularity), "$lt": end}}
+    return await db.sales_buckets.find(query, projection).sort("start", 1).to_list(None)
+
+
+def _add_increments(bucket: Dict[str, Any], inc: Dict[str, float]):
+    """Apply a $inc document to an in-memory bucket"""
+    for path, value in inc.items():
+        target = bucket
+        *parents, leaf = path.split('.')
+        for key in parents:
+            target = target.setdefault(key, {})
+        target[leaf] = target.get(leaf, 0) + value
+
+
+async def backfill(db, batch_size: int = 1000) -> Dict[str, Any]:
+    """Rebuild totals and every sales bucket from paid orders"""
+    categories = {p['id']: p['category'] async for p in db.products.find({}, {"_id": 0, "id": 1, "category": 1})}
+
+    buckets: Dict[str, Dict[str, Any]] = {}
+    cursor = db.orders.find(
+        COUNTED,
+        {"_id": 0, "items": 1, "total_amount": 1, "created_at": 1}
+    ).batch_size(batch_size)
+    async for order in cursor:
+        inc = order_increments(order, categories)
+        for granularity in GRANULARITIES:
+            start = bucket_start(order['created_at'], granularity)
+            bucket = buckets.setdefault(bucket_id(start, granularity), {"granularity": granularity, "start": start})
+            _add_increments(bucket, inc)
+
+    await db.sales_buckets.delete_many({})
+    docs = [{"_id": key, **bucket} for key, bucket in buckets.items()]
+    for i in range(0, len(docs), batch_size):
+        await db.sales_buckets.insert_many(docs[i:i + batch_size], ordered=False)
+
+    totals = await rebuild_totals(db)
+    await db.rollups.update_one(
+        {"_id": STATE_ID},
+        {"$set": {"version": ROLLUPS_VERSION, "backfilled_at": datetime.now(timezone.utc)}, "$unset": {"started_at": ""}},
+        upsert=True
+    )
+    return {"buckets": len(docs), **totals}
+
+
+async def ensure_backfilled(db, stale_after: timedelta = timedelta(hours=1)) -> Optional[Dict[str, Any]]:
+    """Backfill unless the current ROLLUPS_VERSION already was.
+
+    The state document is claimed first, so concurrent instances do not
+    backfill together; a claim older than `stale_after` (crashed run) is
+    taken over. Returns the backfill result, or None if there was nothing
+    to do.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        await db.rollups.update_one(
+            {
+                "_id": STATE_ID,
+                "version": {"$ne": ROLLUPS_VERSION},
+                "$or": [{"started_at": {"$exists": False}}, {"started_at": {"$lt": now - stale_after}}]
+            },
+            {"$set": {"started_at": now}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Already backfilled, or another instance is on it
+        return None
+    return await backfill(db)
+
+
+async def main(run_backfill: bool):
+    load_dotenv(Path(__file__).parent / '.env')
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if run_backfill:
+            result = await backfill(db)
+            print(f"Rebuilt {result['buckets']} buckets, {result['paid_orders']} paid orders, revenue {result['revenue']:.2f}")
+        else:
+            totals = await rebuild_totals(db)
+            print(f"{totals['paid_orders']} paid orders, revenue {totals['revenue']:.2f}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild sales rollups from orders")
+    parser.add_argument("--backfill", action="store_true", help="also rebuild hourly/daily sales buckets")
+    args = parser.parse_args()
+    asyncio.run(main(args.backfill))
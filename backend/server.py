@@ -1,19 +1,39 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Header, Request, Response, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Request, Response, Depends, UploadFile, File, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
+import asyncio
 import logging
+import csv
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
-import requests
+from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest
+from indexes import ensure_indexes, index_drift
+from session_cache import SessionCache
+from passwords import PasswordHasher
+from http_client import OutboundClient
+from payments import create_payment_provider
+from ratings import add_rating
+from stock import commit_stock
+from webhooks import JOB_NAME as PAYMENT_EVENT_JOB, ingest_event, event_job, requeue_pending
+from jobs import JobQueue
+from sessions import SESSION_DURATION, find_active, store_session
+from tokens import ACCESS, REFRESH, RevocationList, TokenIssuer
+from fast_json import FastJSONResponse, construct, trusted_response
+from exports import FORMATS as EXPORT_FORMATS, ndjson_stream, csv_stream
+from product_import import FORMATS as IMPORT_FORMATS, import_products
+from rollups import GRANULARITIES, record_paid_order, get_totals, get_sales_series, ensure_backfilled
+from catalog import CatalogEngine
+from http_cache import ConditionalGetCache
+from pagination import PRODUCT_SORTS, parse_sort, decode_cursor, keyset_filter, next_cursor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -24,24 +44,96 @@ client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # JWT Config
-JWT_SECRET = os.environ.get('JWT_SECRET', 'phytopro-secret-key-2024')
+JWT_SECRET = os.environ.get('JWT_SECRET', '')
 JWT_ALGORITHM = 'HS256'
-EMERGENT_AUTH_URL = 'https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data'
+JWT_SECRET_MIN_LENGTH = 32
+
+# Auth mode: "session" (opaque tokens stored in user_sessions) or "jwt"
+# (signed access/refresh tokens verified without database queries)
+AUTH_MODE = os.environ.get('AUTH_MODE', 'session')
+# Anyone knowing the secret can sign tokens for any account, including
+# admins: jwt mode does not start without a long, explicitly set secret
+if AUTH_MODE == "jwt" and len(JWT_SECRET) < JWT_SECRET_MIN_LENGTH:
+    raise RuntimeError(f"AUTH_MODE=jwt requiert JWT_SECRET (au moins {JWT_SECRET_MIN_LENGTH} caractères)")
+token_issuer = TokenIssuer(
+    db,
+    JWT_SECRET,
+    JWT_ALGORITHM,
+    RevocationList(db, sync_interval=float(os.environ.get('TOKEN_REVOCATION_SYNC_INTERVAL', '30'))),
+    access_ttl=timedelta(minutes=int(os.environ.get('ACCESS_TOKEN_TTL_MINUTES', '15'))),
+    refresh_ttl=timedelta(days=int(os.environ.get('REFRESH_TOKEN_TTL_DAYS', '30')))
+)
+EMERGENT_AUTH_URL = os.environ.get('EMERGENT_AUTH_URL', 'https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data')
 
 # Stripe Config
 STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY', 'sk_test_emergent')
 STRIPE_SECRET_KEY = os.environ['STRIPE_SECRET_KEY']
 
+# Frontend origins accepted as checkout origin_url, from which the Stripe
+# redirect and webhook URLs are built (defaults to the CORS origins; "*"
+# accepts any)
+CHECKOUT_ORIGINS = {
+    origin.strip().rstrip('/')
+    for origin in os.environ.get('CHECKOUT_ORIGINS', os.environ.get('CORS_ORIGINS', '*')).split(',')
+    if origin.strip()
+}
+
+# Payment provider: "stripe", or "fake" to complete payments locally (benchmarks)
+payment_provider = create_payment_provider(
+    os.environ.get('PAYMENT_PROVIDER', 'stripe'),
+    api_key=STRIPE_SECRET_KEY,
+    timeout=float(os.environ.get('PAYMENT_TIMEOUT', '15')),
+    fake_latency=float(os.environ.get('FAKE_PAYMENT_LATENCY', '0'))
+)
+
 # Shipping Config
 SHIPPING_COST = float(os.environ.get('SHIPPING_COST', '9.90'))
 FREE_SHIPPING_THRESHOLD = float(os.environ.get('FREE_SHIPPING_THRESHOLD', '150.00'))
 
+# Sessions Config
+MAX_SESSIONS_PER_USER = int(os.environ.get('MAX_SESSIONS_PER_USER', '10'))
+
+# Session cache Config
+session_cache = SessionCache(
+    maxsize=int(os.environ.get('SESSION_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('SESSION_CACHE_TTL', '60'))
+)
+
+# Outbound HTTP Config
+http_client = OutboundClient(
+    connect_timeout=float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3')),
+    read_timeout=float(os.environ.get('HTTP_READ_TIMEOUT', '10')),
+    retries=int(os.environ.get('HTTP_RETRIES', '2'))
+)
+
+# Password hashing Config
+password_hasher = PasswordHasher(
+    rounds=int(os.environ.get('BCRYPT_ROUNDS', '12')),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '4')),
+    max_pending=int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', '64'))
+)
+
+# Catalog snapshot Config
+CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT', 'false').lower() == 'true'
+catalog = CatalogEngine(db, max_age=float(os.environ.get('CATALOG_SNAPSHOT_MAX_AGE', '30')))
+
+# Background jobs Config
+jobs = JobQueue(
+    db,
+    concurrency=int(os.environ.get('JOB_WORKERS', '4')),
+    poll_interval=float(os.environ.get('JOB_POLL_INTERVAL', '5')),
+    visibility_timeout=float(os.environ.get('JOB_VISIBILITY_TIMEOUT', '300')),
+    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+)
+# Webhook events received but never queued are picked up after this delay
+PAYMENT_EVENT_SWEEP_INTERVAL = float(os.environ.get('PAYMENT_EVENT_SWEEP_INTERVAL', '60'))
+
 # ============= Models =============
 
 # User Models
@@ -78,6 +170,9 @@ class UserLogin(BaseModel):
 class SessionData(BaseModel):
     session_id: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 # Product Models
 class Product(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -100,6 +195,7 @@ class Product(BaseModel):
     featured: bool = False
     rating: float = 0.0
     reviews_count: int = 0
+    rating_histogram: Dict[str, int] = Field(default_factory=dict)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Category(BaseModel):
@@ -185,7 +281,7 @@ class Review(BaseModel):
 
 class CreateReview(BaseModel):
     product_id: str
-    rating: int
+    rating: int = Field(ge=1, le=5)
     comment: str
 
 # Contact Model
@@ -253,21 +349,26 @@ async def get_current_user(request: Request, authorization: Optional[str] = Head
     if not session_token:
         return None
     
-    # Check session in database
-    session = await db.user_sessions.find_one({"session_token": session_token})
-    if not session:
-        return None
-    
-    # Handle expires_at as datetime or string
-    expires_at = session['expires_at']
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
+    if AUTH_MODE == "jwt":
+        claims = await token_issuer.verify(session_token, ACCESS)
+        if not claims:
+            return None
+        # Everything comes from the signed token: no query
+        return User.model_construct(
+            id=claims['sub'],
+            email=claims['email'],
+            name=claims['name'],
+            is_admin=claims['adm'],
+            is_professional=claims['pro']
+        )
     
-    # Make sure both datetimes are timezone-aware
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    cached_user = session_cache.get(session_token)
+    if cached_user:
+        return cached_user
     
-    if expires_at < datetime.now(timezone.utc):
+    # Check session in database (expired sessions do not match)
+    session = await find_active(db, session_token)
+    if not session:
         return None
     
     # Get user
@@ -275,7 +376,51 @@ async def get_current_user(request: Request, authorization: Optional[str] = Head
     if not user_doc:
         return None
     
-    return User(**user_doc)
+    user = User(**user_doc)
+    session_cache.set(session_token, user, session['expires_at'])
+    return user
+
+async def create_session(session: UserSession):
+    """Store a new session; the user's oldest sessions beyond the cap are revoked"""
+    for token in await store_session(db, session.model_dump(), MAX_SESSIONS_PER_USER):
+        session_cache.invalidate_token(token)
+
+def set_auth_cookie(response: Response, key: str, value: str, max_age: timedelta, path: str = "/"):
+    response.set_cookie(
+        key=key,
+        value=value,
+        httponly=True,
+        secure=True,
+        samesite="none",
+        max_age=int(max_age.total_seconds()),
+        path=path
+    )
+
+def set_token_cookies(response: Response, tokens: Dict[str, Any]):
+    set_auth_cookie(response, "session_token", tokens['access_token'], token_issuer.access_ttl)
+    # Only sent to the auth routes that need it
+    set_auth_cookie(response, "refresh_token", tokens['refresh_token'], token_issuer.refresh_ttl, path="/api/auth")
+
+async def start_session(user: User, response: Optional[Response] = None, session_token: Optional[str] = None) -> Dict[str, Any]:
+    """Log a user in according to AUTH_MODE; sets the cookies when given a response.
+    
+    Returns the token fields of the auth responses.
+    """
+    if AUTH_MODE == "jwt":
+        tokens = await token_issuer.login(user)
+        if response is not None:
+            set_token_cookies(response, tokens)
+        return {"session_token": tokens['access_token'], "refresh_token": tokens['refresh_token'], "expires_in": tokens['expires_in']}
+    
+    session = UserSession(
+        user_id=user.id,
+        expires_at=datetime.now(timezone.utc) + SESSION_DURATION,
+        **({"session_token": session_token} if session_token else {})
+    )
+    await create_session(session)
+    if response is not None:
+        set_auth_cookie(response, "session_token", session.session_token, SESSION_DURATION)
+    return {"session_token": session.session_token}
 
 async def require_auth(request: Request, authorization: Optional[str] = Header(None)) -> User:
     """Require authentication"""
@@ -291,11 +436,11 @@ async def require_admin(request: Request, authorization: Optional[str] = Header(
         raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
     return user
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
 
 # ============= Auth Routes =============
 
@@ -310,7 +455,7 @@ async def register(user_data: UserRegister):
     user = User(
         email=user_data.email,
         name=user_data.name,
-        password_hash=hash_password(user_data.password),
+        password_hash=await hash_password(user_data.password),
         is_professional=user_data.is_professional,
         certificate_number=user_data.certificate_number
     )
@@ -318,13 +463,9 @@ async def register(user_data: UserRegister):
     await db.users.insert_one(user.model_dump())
     
     # Create session
-    session = UserSession(
-        user_id=user.id,
-        expires_at=datetime.now(timezone.utc) + timedelta(days=7)
-    )
-    await db.user_sessions.insert_one(session.model_dump())
+    auth = await start_session(user)
     
-    return {"user": user.model_dump(exclude={'password_hash'}), "session_token": session.session_token}
+    return {"user": user.model_dump(exclude={'password_hash'}), **auth}
 
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin, response: Response):
@@ -334,37 +475,28 @@ async def login(credentials: UserLogin, response: Response):
         raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
     
     # Verify password
-    if not verify_password(credentials.password, user_doc['password_hash']):
+    if not await verify_password(credentials.password, user_doc['password_hash']):
         raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
     
-    user = User(**user_doc)
+    # Upgrade the hash if the configured cost changed
+    if password_hasher.needs_rehash(user_doc['password_hash']):
+        user_doc['password_hash'] = await hash_password(credentials.password)
+        await db.users.update_one({"id": user_doc['id']}, {"$set": {"password_hash": user_doc['password_hash']}})
+        session_cache.invalidate_user(user_doc['id'])
     
-    # Create session
-    session = UserSession(
-        user_id=user.id,
-        expires_at=datetime.now(timezone.utc) + timedelta(days=7)
-    )
-    await db.user_sessions.insert_one(session.model_dump())
+    user = User(**user_doc)
     
-    # Set cookie
-    response.set_cookie(
-        key="session_token",
-        value=session.session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        max_age=7*24*60*60,
-        path="/"
-    )
+    # Create session and set cookie
+    auth = await start_session(user, response)
     
-    return {"user": user.model_dump(exclude={'password_hash'}), "session_token": session.session_token}
+    return {"user": user.model_dump(exclude={'password_hash'}), **auth}
 
 @api_router.post("/auth/session")
 async def process_emergent_session(session_data: SessionData, response: Response):
     """Process Emergent Google OAuth session"""
     try:
         # Get user data from Emergent
-        resp = requests.get(
+        resp = await http_client.get(
             EMERGENT_AUTH_URL,
             headers={"X-Session-ID": session_data.session_id}
         )
@@ -388,26 +520,10 @@ async def process_emergent_session(session_data: SessionData, response: Response
             )
             await db.users.insert_one(user.model_dump())
         
-        # Create session
-        session = UserSession(
-            user_id=user.id,
-            session_token=data['session_token'],
-            expires_at=datetime.now(timezone.utc) + timedelta(days=7)
-        )
-        await db.user_sessions.insert_one(session.model_dump())
+        # Create session and set cookie
+        auth = await start_session(user, response, session_token=data['session_token'])
         
-        # Set cookie
-        response.set_cookie(
-            key="session_token",
-            value=session.session_token,
-            httponly=True,
-            secure=True,
-            samesite="none",
-            max_age=7*24*60*60,
-            path="/"
-        )
-        
-        return {"user": user.model_dump(exclude={'password_hash'}), "session_token": session.session_token}
+        return {"user": user.model_dump(exclude={'password_hash'}), **auth}
         
     except Exception as e:
         logging.error(f"Erreur auth Emergent: {e}")
@@ -418,21 +534,82 @@ async def get_me(request: Request, authorization: Optional[str] = Header(None)):
     user = await get_current_user(request, authorization)
     if not user:
         raise HTTPException(status_code=401, detail="Non authentifié")
+    if AUTH_MODE == "jwt":
+        # Tokens only carry the essentials; the profile has the rest
+        user_doc = await db.users.find_one({"id": user.id})
+        if not user_doc:
+            raise HTTPException(status_code=401, detail="Non authentifié")
+        user = User(**user_doc)
     return user.model_dump(exclude={'password_hash'})
 
+@api_router.post("/auth/refresh")
+async def refresh_tokens(request: Request, response: Response, body: Optional[RefreshRequest] = None):
+    """Exchange a refresh token for a new token pair (jwt mode)"""
+    if AUTH_MODE != "jwt":
+        raise HTTPException(status_code=404, detail="Non disponible")
+    
+    refresh_token = (body.refresh_token if body else None) or request.cookies.get('refresh_token')
+    claims = token_issuer.decode(refresh_token, REFRESH) if refresh_token else None
+    if not claims or await token_issuer.revocations.is_revoked(claims['sid']):
+        raise HTTPException(status_code=401, detail="Session expirée")
+    
+    # Reload the user so role changes reach the new access token
+    user_doc = await db.users.find_one({"id": claims['sub']})
+    if not user_doc:
+        raise HTTPException(status_code=401, detail="Session expirée")
+    
+    # Rotation: a refresh token is used once; a replayed one (likely stolen)
+    # ends the whole session
+    tokens = await token_issuer.rotate(claims, User(**user_doc))
+    if not tokens:
+        await token_issuer.revoke_session(claims)
+        raise HTTPException(status_code=401, detail="Session expirée")
+    
+    set_token_cookies(response, tokens)
+    return {"session_token": tokens['access_token'], "refresh_token": tokens['refresh_token'], "expires_in": tokens['expires_in']}
+
 @api_router.post("/auth/logout")
 async def logout(request: Request, response: Response, authorization: Optional[str] = Header(None)):
     session_token = await get_session_token(request, authorization)
-    if session_token:
+    if AUTH_MODE == "jwt":
+        # Revoke the whole login, through whichever token is still valid
+        claims = await token_issuer.verify(session_token, ACCESS) if session_token else None
+        refresh_token = request.cookies.get('refresh_token')
+        if not claims and refresh_token:
+            claims = await token_issuer.verify(refresh_token, REFRESH)
+        if claims:
+            await token_issuer.revoke_session(claims)
+        response.delete_cookie(key="refresh_token", path="/api/auth")
+    elif session_token:
         await db.user_sessions.delete_one({"session_token": session_token})
+        session_cache.invalidate_token(session_token)
     
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Déconnecté"}
 
 # ============= Product Routes =============
 
+# Facets returned by /products/facets, and the lower bounds of its price buckets
+PRODUCT_FACETS = ("category", "subcategory", "brand", "is_bio")
+PRICE_FACET_BOUNDARIES = [0, 20, 50, 100, 200, 500]
+
+def build_text_search(search: str) -> str:
+    """Turn user input into a $text search string of plain terms.
+
+    Quotes and leading minus signs would be read as phrase and negation
+    operators, so they are stripped; stemming and accent folding are done
+    by the French text index declared in indexes.py.
+    """
+    terms = []
+    for term in search.replace('"', ' ').split():
+        term = term.lstrip('-')
+        if term:
+            terms.append(term)
+    return ' '.join(terms[:20])
+
 @api_router.get("/products", response_model=List[Product])
 async def get_products(
+    response: Response,
     category: Optional[str] = None,
     subcategory: Optional[str] = None,
     brand: Optional[str] = None,
@@ -440,9 +617,39 @@ async def get_products(
     search: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 20
 ):
+    # Keyset pagination: with a sort, pages are chained through X-Next-Cursor
+    if sort is not None and sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail="Tri invalide")
+    if cursor and not sort:
+        raise HTTPException(status_code=400, detail="Le curseur nécessite un tri")
+    sort_spec = parse_sort(sort) if sort else None
+    
+    if CATALOG_SNAPSHOT and not search:
+        snapshot = await catalog.snapshot()
+        products = snapshot.query(
+            category=category, subcategory=subcategory, brand=brand, is_bio=is_bio,
+            min_price=min_price, max_price=max_price, skip=skip, limit=limit,
+            sort=sort_spec, after=decode_cursor(cursor) if cursor else None
+        )
+    else:
+        products = await find_products(
+            category, subcategory, brand, is_bio, search, min_price, max_price,
+            sort_spec, cursor, skip, limit
+        )
+    
+    if sort_spec:
+        token = next_cursor(products, sort_spec[0], limit)
+        if token:
+            response.headers["X-Next-Cursor"] = token
+    return trusted_response(Product, products, response)
+
+def build_product_query(category, subcategory, brand, is_bio, search, min_price, max_price) -> Optional[Dict[str, Any]]:
+    """Mongo filter for the product listing parameters, or None if it can match nothing"""
     query = {}
     if category:
         query['category'] = category
@@ -453,54 +660,186 @@ async def get_products(
     if is_bio is not None:
         query['is_bio'] = is_bio
     if search:
-        query['$or'] = [
-            {'name': {'$regex': search, '$options': 'i'}},
-            {'description': {'$regex': search, '$options': 'i'}}
-        ]
+        text_search = build_text_search(search)
+        if not text_search:
+            return None
+        query['$text'] = {'$search': text_search}
     if min_price is not None or max_price is not None:
         query['price'] = {}
         if min_price is not None:
             query['price']['$gte'] = min_price
         if max_price is not None:
             query['price']['$lte'] = max_price
+    return query
+
+async def find_products(category, subcategory, brand, is_bio, search, min_price, max_price, sort_spec, cursor, skip, limit):
+    query = build_product_query(category, subcategory, brand, is_bio, search, min_price, max_price)
+    if query is None:
+        return []
+    
+    if sort_spec:
+        field, direction = sort_spec
+        if cursor:
+            query = {"$and": [query, keyset_filter(field, direction, cursor)]}
+        find_cursor = db.products.find(query, {"_id": 0}).sort([(field, direction), ("id", direction)])
+    elif search:
+        # Rank by relevance
+        projection = {"_id": 0, "score": {"$meta": "textScore"}}
+        find_cursor = db.products.find(query, projection).sort([("score", {"$meta": "textScore"})])
+    else:
+        find_cursor = db.products.find(query, {"_id": 0})
     
-    products = await db.products.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
-    return products
+    return await find_cursor.skip(skip).limit(limit).to_list(limit)
 
 @api_router.get("/products/featured", response_model=List[Product])
 async def get_featured_products():
+    if CATALOG_SNAPSHOT:
+        snapshot = await catalog.snapshot()
+        return trusted_response(Product, snapshot.query(featured=True, limit=6))
+    
     products = await db.products.find({"featured": True}, {"_id": 0}).limit(6).to_list(6)
-    return products
+    return trusted_response(Product, products)
+
+def format_price_facet(buckets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Turn {lower boundary: count} buckets into [{min, max, count}].
+
+    Products priced outside the boundaries (negative, missing, not a
+    number) are counted in a last {min: None, max: None} bucket.
+    """
+    bounds = dict(zip(PRICE_FACET_BOUNDARIES, PRICE_FACET_BOUNDARIES[1:] + [None]))
+    facet = [{"min": b["_id"], "max": bounds[b["_id"]], "count": b["count"]} for b in buckets if b["_id"] != "other"]
+    facet += [{"min": None, "max": None, "count": b["count"]} for b in buckets if b["_id"] == "other"]
+    return facet
+
+@api_router.get("/products/facets")
+async def get_product_facets(
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+    brand: Optional[str] = None,
+    is_bio: Optional[bool] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 20
+):
+    """Facet counts for the current filter plus one page of results.
+
+    Items are shaped as `Product`, like the other listings, so internal
+    fields (rating sums, stock holds, text score) are not exposed.
+    """
+    if sort is not None and sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail="Tri invalide")
+    sort_spec = parse_sort(sort) if sort else None
+    
+    if CATALOG_SNAPSHOT and not search:
+        snapshot = await catalog.snapshot()
+        result = snapshot.facets(
+            PRICE_FACET_BOUNDARIES,
+            category=category, subcategory=subcategory, brand=brand, is_bio=is_bio,
+            min_price=min_price, max_price=max_price, skip=skip, limit=limit, sort=sort_spec
+        )
+        return {**result, "items": construct(Product, result["items"])}
+    
+    query = build_product_query(category, subcategory, brand, is_bio, search, min_price, max_price)
+    if query is None:
+        return {"items": [], "total": 0, "facets": {field: [] for field in PRODUCT_FACETS + ("price",)}}
+    
+    items_pipeline = []
+    if sort_spec:
+        items_pipeline.append({"$sort": {sort_spec[0]: sort_spec[1], "id": sort_spec[1]}})
+    elif search:
+        items_pipeline.append({"$sort": {"score": {"$meta": "textScore"}}})
+    items_pipeline += [{"$skip": skip}, {"$limit": limit}, {"$project": {"_id": 0}}]
+    
+    facet_stages = {
+        field: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}, {"$sort": {"count": -1, "_id": 1}}]
+        for field in PRODUCT_FACETS
+    }
+    facet_stages["price"] = [{"$bucket": {
+        "groupBy": "$price",
+        "boundaries": PRICE_FACET_BOUNDARIES + [float("inf")],
+        # Without it, a single out-of-range price fails the whole aggregation
+        "default": "other",
+        "output": {"count": {"$sum": 1}}
+    }}]
+    
+    pipeline = [
+        {"$match": query},
+        {"$facet": {"items": items_pipeline, "total": [{"$count": "count"}], **facet_stages}}
+    ]
+    result = (await db.products.aggregate(pipeline).to_list(1))[0]
+    
+    facets = {
+        field: [{"value": b["_id"], "count": b["count"]} for b in result[field]]
+        for field in PRODUCT_FACETS
+    }
+    facets["price"] = format_price_facet(result["price"])
+    return {
+        "items": construct(Product, result["items"]),
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "facets": facets
+    }
 
 @api_router.get("/products/{slug}", response_model=Product)
 async def get_product(slug: str):
+    if CATALOG_SNAPSHOT:
+        snapshot = await catalog.snapshot()
+        product = snapshot.by_slug.get(slug)
+        if not product:
+            raise HTTPException(status_code=404, detail="Produit non trouvé")
+        return trusted_response(Product, product)
+    
     product = await db.products.find_one({"slug": slug}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
-    return product
+    return trusted_response(Product, product)
 
 @api_router.get("/categories", response_model=List[Category])
 async def get_categories():
     categories = await db.categories.find({}, {"_id": 0}).to_list(100)
-    return categories
+    return trusted_response(Category, categories)
 
 # ============= Cart Routes =============
 
+async def get_cart_lines(user_id: str) -> List[Dict[str, Any]]:
+    """Cart items joined with their product and line total, in one aggregation"""
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$limit": 100},
+        {"$lookup": {
+            "from": "products",
+            "localField": "product_id",
+            "foreignField": "id",
+            "as": "product"
+        }},
+        # Items whose product no longer exists are dropped
+        {"$unwind": "$product"},
+        {"$project": {"_id": 0, "product._id": 0}},
+        {"$addFields": {"line_total": {"$multiply": ["$product.price", "$quantity"]}}}
+    ]
+    return await db.cart_items.aggregate(pipeline).to_list(100)
+
 @api_router.get("/cart")
 async def get_cart(user: User = Depends(require_auth)):
-    cart_items = await db.cart_items.find({"user_id": user.id}, {"_id": 0}).to_list(100)
-    
-    # Enrich with product data
-    enriched_items = []
-    for item in cart_items:
-        product = await db.products.find_one({"id": item['product_id']}, {"_id": 0})
-        if product:
-            enriched_items.append({
-                **item,
-                "product": product
-            })
-    
-    return enriched_items
+    return await get_cart_lines(user.id)
+
+@api_router.get("/cart/summary")
+async def get_cart_summary(user: User = Depends(require_auth)):
+    """Cart items with line totals, subtotal and shipping in a single response"""
+    items = await get_cart_lines(user.id)
+    subtotal = sum(item['line_total'] for item in items)
+    shipping_cost = calculate_shipping(subtotal)
+    return {
+        "items": items,
+        "subtotal": subtotal,
+        "shipping_cost": shipping_cost,
+        "total_amount": subtotal + shipping_cost,
+        "free_shipping_threshold": FREE_SHIPPING_THRESHOLD,
+        "is_free": shipping_cost == 0.0,
+        "amount_for_free_shipping": max(0, FREE_SHIPPING_THRESHOLD - subtotal)
+    }
 
 @api_router.post("/cart/add")
 async def add_to_cart(item: AddToCart, user: User = Depends(require_auth)):
@@ -584,40 +923,38 @@ async def get_shipping_info(subtotal: float):
 
 @api_router.post("/checkout/create-order")
 async def create_order(order_request: CreateOrderRequest, user: User = Depends(require_auth)):
-    # Get cart items
-    cart_items = await db.cart_items.find({"user_id": user.id}, {"_id": 0}).to_list(100)
+    origin_url = order_request.origin_url.rstrip('/')
+    if "*" not in CHECKOUT_ORIGINS and origin_url not in CHECKOUT_ORIGINS:
+        raise HTTPException(status_code=400, detail="Origine non autorisée")
     
-    if not cart_items:
+    # Get cart items with their products in one query
+    cart_lines = await get_cart_lines(user.id)
+    
+    if not cart_lines:
         raise HTTPException(status_code=400, detail="Panier vide")
     
-    # Calculate total and prepare order items
-    order_items = []
-    subtotal = 0.0
+    # Check stock for every line at once
+    out_of_stock = [line['product']['name'] for line in cart_lines if line['product']['stock'] < line['quantity']]
+    if out_of_stock:
+        raise HTTPException(status_code=400, detail=f"Stock insuffisant pour {', '.join(out_of_stock)}")
     
-    for cart_item in cart_items:
-        product = await db.products.find_one({"id": cart_item['product_id']}, {"_id": 0})
-        if not product:
-            continue
-        
-        # Check stock
-        if product['stock'] < cart_item['quantity']:
-            raise HTTPException(status_code=400, detail=f"Stock insuffisant pour {product['name']}")
-        
-        item_total = product['price'] * cart_item['quantity']
-        subtotal += item_total
-        
-        order_items.append(OrderItem(
-            product_id=product['id'],
-            product_name=product['name'],
-            quantity=cart_item['quantity'],
-            price=product['price']
-        ))
+    # Calculate total and prepare order items
+    order_items = [
+        OrderItem(
+            product_id=line['product']['id'],
+            product_name=line['product']['name'],
+            quantity=line['quantity'],
+            price=line['product']['price']
+        )
+        for line in cart_lines
+    ]
+    subtotal = sum(line['line_total'] for line in cart_lines)
     
     # Calculate shipping
     shipping_cost = calculate_shipping(subtotal)
     total_amount = subtotal + shipping_cost
     
-    # Create order
+    # Build order; it is only persisted once the Stripe session exists
     order = Order(
         user_id=user.id,
         items=order_items,
@@ -628,15 +965,11 @@ async def create_order(order_request: CreateOrderRequest, user: User = Depends(r
         status="pending"
     )
     
-    await db.orders.insert_one(order.model_dump())
-    
     # Create Stripe checkout session
     try:
-        webhook_url = f"{order_request.origin_url}/api/webhook/stripe"
-        stripe_checkout = StripeCheckout(api_key=STRIPE_SECRET_KEY, webhook_url=webhook_url)
-        
-        success_url = f"{order_request.origin_url}/commande/succes?session_id={{{{CHECKOUT_SESSION_ID}}}}"
-        cancel_url = f"{order_request.origin_url}/panier"
+        webhook_url = f"{origin_url}/api/webhook/stripe"
+        success_url = f"{origin_url}/commande/succes?session_id={{{{CHECKOUT_SESSION_ID}}}}"
+        cancel_url = f"{origin_url}/panier"
         
         checkout_request = CheckoutSessionRequest(
             amount=float(total_amount),
@@ -649,7 +982,8 @@ async def create_order(order_request: CreateOrderRequest, user: User = Depends(r
             }
         )
         
-        session = await stripe_checkout.create_checkout_session(checkout_request)
+        session = await payment_provider.create_checkout_session(checkout_request, webhook_url)
+        order.payment_session_id = session.session_id
         
         # Create payment transaction
         payment = PaymentTransaction(
@@ -663,12 +997,10 @@ async def create_order(order_request: CreateOrderRequest, user: User = Depends(r
             metadata={"order_id": order.id}
         )
         
-        await db.payment_transactions.insert_one(payment.model_dump())
-        
-        # Update order with payment session
-        await db.orders.update_one(
-            {"id": order.id},
-            {"$set": {"payment_session_id": session.session_id}}
+        # Independent writes, issued concurrently
+        await asyncio.gather(
+            db.orders.insert_one(order.model_dump()),
+            db.payment_transactions.insert_one(payment.model_dump())
         )
         
         return {"checkout_url": session.url, "session_id": session.session_id, "order_id": order.id}
@@ -677,41 +1009,75 @@ async def create_order(order_request: CreateOrderRequest, user: User = Depends(r
         logging.error(f"Erreur création checkout Stripe: {e}")
         raise HTTPException(status_code=500, detail="Erreur de paiement")
 
+async def mark_order_paid(order_id: str) -> Optional[Dict[str, Any]]:
+    """Move a pending order to paid; returns it, or None if it was not pending.
+    `finalize_pending` stays set until its finalization job has completed."""
+    return await db.orders.find_one_and_update(
+        {"id": order_id, "status": "pending"},
+        {"$set": {"status": "paid", "finalize_pending": True}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def finalize_paid_session(session_id: str):
+    """Apply a confirmed payment: queue the order's finalization (stock,
+    rollups, cart) and mark it paid. Idempotent, so status polling, webhooks
+    and replays can all call it safely."""
+    payment = await db.payment_transactions.find_one_and_update(
+        {"session_id": session_id, "payment_status": {"$ne": "paid"}},
+        {"$set": {"status": "completed", "payment_status": "paid"}}
+    )
+    if not payment:
+        # Already paid (every later status poll): read only, the order may
+        # still need its finalization queued
+        payment = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0, "order_id": 1})
+    if not payment or not payment.get('order_id'):
+        return
+    
+    order = await db.orders.find_one({"id": payment['order_id']}, {"_id": 0, "status": 1, "finalize_pending": 1})
+    if not order or not (order['status'] == "pending" or order.get('finalize_pending')):
+        return
+    
+    # Queued before the order moves to paid: if the process dies in between,
+    # the job applies the transition itself. The dedupe key makes repeated
+    # calls no-ops.
+    await jobs.enqueue("finalize_order", {"order_id": payment['order_id']}, dedupe_key=f"finalize_order:{payment['order_id']}")
+    await mark_order_paid(payment['order_id'])
+
+@jobs.handler("finalize_order")
+async def finalize_order_job(payload: Dict[str, Any]):
+    """Side effects of a paid order. Each step is idempotent where it writes,
+    so a job retried after a crash does not apply any of them twice."""
+    order = await mark_order_paid(payload['order_id']) or await db.orders.find_one({"id": payload['order_id']}, {"_id": 0})
+    if not order or not order.get('finalize_pending'):
+        return
+    
+    # Records stock_committed on the order; False flags a paid but not
+    # servable order for manual follow-up
+    await commit_stock(db, order['id'], order['items'])
+    catalog.invalidate()
+    
+    await record_paid_order(db, order)
+    await db.cart_items.delete_many({"user_id": order['user_id']})
+    await db.orders.update_one({"id": order['id']}, {"$unset": {"finalize_pending": ""}})
+
+async def handle_payment_event(event: Dict[str, Any]):
+    if event.get('payment_status') == "paid" and event.get('session_id'):
+        await finalize_paid_session(event['session_id'])
+
+jobs.handler(PAYMENT_EVENT_JOB)(event_job(db, handle_payment_event))
+
+@jobs.periodic(PAYMENT_EVENT_SWEEP_INTERVAL)
+async def sweep_payment_events():
+    await requeue_pending(db, jobs, grace=PAYMENT_EVENT_SWEEP_INTERVAL)
+
 @api_router.get("/checkout/status/{session_id}")
 async def get_checkout_status(session_id: str, user: User = Depends(require_auth)):
     try:
-        stripe_checkout = StripeCheckout(api_key=STRIPE_SECRET_KEY, webhook_url="")
-        status = await stripe_checkout.get_checkout_status(session_id)
-        
-        # Update payment transaction
-        payment = await db.payment_transactions.find_one({"session_id": session_id})
+        status = await payment_provider.get_checkout_status(session_id)
         
-        if payment and payment['payment_status'] != 'paid' and status.payment_status == 'paid':
-            # Update payment
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {"$set": {"status": "completed", "payment_status": "paid"}}
-            )
-            
-            # Update order
-            order_id = payment.get('order_id')
-            if order_id:
-                await db.orders.update_one(
-                    {"id": order_id},
-                    {"$set": {"status": "paid"}}
-                )
-                
-                # Update stock and clear cart
-                order = await db.orders.find_one({"id": order_id})
-                if order:
-                    for item in order['items']:
-                        await db.products.update_one(
-                            {"id": item['product_id']},
-                            {"$inc": {"stock": -item['quantity']}}
-                        )
-                    
-                    # Clear cart
-                    await db.cart_items.delete_many({"user_id": user.id})
+        if status.payment_status == 'paid':
+            await finalize_paid_session(session_id)
         
         return status.model_dump()
         
@@ -721,61 +1087,71 @@ async def get_checkout_status(session_id: str, user: User = Depends(require_auth
 
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
+    body = await request.body()
+    signature = request.headers.get("Stripe-Signature")
+    
     try:
-        body = await request.body()
-        signature = request.headers.get("Stripe-Signature")
-        
-        stripe_checkout = StripeCheckout(api_key=STRIPE_SECRET_KEY, webhook_url="")
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
-        
-        if webhook_response.payment_status == "paid":
-            # Update payment and order
-            payment = await db.payment_transactions.find_one({"session_id": webhook_response.session_id})
-            
-            if payment and payment['payment_status'] != 'paid':
-                await db.payment_transactions.update_one(
-                    {"session_id": webhook_response.session_id},
-                    {"$set": {"status": "completed", "payment_status": "paid"}}
-                )
-                
-                order_id = payment.get('order_id')
-                if order_id:
-                    await db.orders.update_one(
-                        {"id": order_id},
-                        {"$set": {"status": "paid"}}
-                    )
-        
-        return {"status": "success"}
-        
+        event = await payment_provider.handle_webhook(body, signature)
     except Exception as e:
         logging.error(f"Erreur webhook: {e}")
-        return {"status": "error"}
+        raise HTTPException(status_code=400, detail="Webhook invalide")
+    
+    # Persist and acknowledge; processing happens in the background. Stripe
+    # retries on a 5xx, so an event that could not be stored is not lost.
+    try:
+        await ingest_event(db, jobs, event, body)
+    except Exception as e:
+        logging.error(f"Erreur enregistrement webhook: {e}")
+        raise HTTPException(status_code=503, detail="Webhook non enregistré")
+    
+    return {"status": "success"}
 
 # ============= Order Routes =============
 
 @api_router.get("/orders", response_model=List[Order])
-async def get_orders(user: User = Depends(require_auth)):
-    orders = await db.orders.find({"user_id": user.id}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return orders
+async def get_orders(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100),
+    user: User = Depends(require_auth)
+):
+    query = {"user_id": user.id}
+    if cursor:
+        query = {"$and": [query, keyset_filter("created_at", -1, cursor)]}
+    
+    orders = await db.orders.find(query, {"_id": 0}).sort([("created_at", -1), ("id", -1)]).limit(limit).to_list(limit)
+    
+    token = next_cursor(orders, "created_at", limit)
+    if token:
+        response.headers["X-Next-Cursor"] = token
+    return trusted_response(Order, orders, response)
 
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str, user: User = Depends(require_auth)):
     order = await db.orders.find_one({"id": order_id, "user_id": user.id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Commande non trouvée")
-    return order
+    return trusted_response(Order, order)
 
 # ============= Review Routes =============
 
 @api_router.get("/reviews/{product_id}", response_model=List[Review])
-async def get_reviews(product_id: str):
-    reviews = await db.reviews.find({"product_id": product_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return reviews
+async def get_reviews(product_id: str, response: Response, cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=100)):
+    query = {"product_id": product_id}
+    if cursor:
+        query = {"$and": [query, keyset_filter("created_at", -1, cursor)]}
+    
+    reviews = await db.reviews.find(query, {"_id": 0}).sort([("created_at", -1), ("id", -1)]).limit(limit).to_list(limit)
+    
+    token = next_cursor(reviews, "created_at", limit)
+    if token:
+        response.headers["X-Next-Cursor"] = token
+    return trusted_response(Review, reviews, response)
 
 @api_router.post("/reviews")
 async def create_review(review: CreateReview, user: User = Depends(require_auth)):
     # Check if product exists
-    product = await db.products.find_one({"id": review.product_id})
+    product = await db.products.find_one({"id": review.product_id}, {"_id": 1})
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
     
@@ -793,26 +1169,75 @@ async def create_review(review: CreateReview, user: User = Depends(require_auth)
         comment=review.comment
     )
     
-    await db.reviews.insert_one(new_review.model_dump())
-    
-    # Update product rating
-    all_reviews = await db.reviews.find({"product_id": review.product_id}, {"_id": 0}).to_list(1000)
-    avg_rating = sum(r['rating'] for r in all_reviews) / len(all_reviews)
+    try:
+        await db.reviews.insert_one(new_review.model_dump())
+    except DuplicateKeyError:
+        # Concurrent duplicate caught by the unique (product_id, user_id) index
+        raise HTTPException(status_code=400, detail="Vous avez déjà évalué ce produit")
     
-    await db.products.update_one(
-        {"id": review.product_id},
-        {"$set": {"rating": round(avg_rating, 1), "reviews_count": len(all_reviews)}}
-    )
+    # The review list is served from the catalog-versioned cache: invalidate
+    # now so the author sees their review on the next read. Only the rating
+    # aggregates are updated in the background (invalidating again).
+    catalog.invalidate()
+    await jobs.enqueue("apply_rating", {"review_id": new_review.id}, dedupe_key=f"apply_rating:{new_review.id}")
     
     return new_review
 
+@jobs.handler("apply_rating")
+async def apply_rating_job(payload: Dict[str, Any]):
+    review = await db.reviews.find_one({"id": payload['review_id']})
+    if not review or review.get('rating_applied'):
+        return
+    # The product update itself skips a review it already counted, so a job
+    # retried after a crash at any point applies it exactly once
+    if await add_rating(db, review['product_id'], review['rating'], review['id']):
+        catalog.invalidate()
+    await db.reviews.update_one({"id": review['id']}, {"$set": {"rating_applied": True}})
+
 # ============= Admin Routes =============
 
 @api_router.get("/admin/products", response_model=List[Product])
 async def admin_get_all_products(user: User = Depends(require_admin)):
     """Get all products (admin only)"""
     products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    return products
+    return trusted_response(Product, products)
+
+@api_router.get("/admin/products/export")
+async def admin_export_products(
+    format: str = "ndjson",
+    fields: Optional[str] = None,
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+    brand: Optional[str] = None,
+    is_bio: Optional[bool] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    user: User = Depends(require_admin)
+):
+    """Stream the whole catalog, or the products matching the listing filters (admin only)"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format invalide")
+    
+    selected = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(Product.model_fields)
+    unknown = [f for f in selected if f not in Product.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Champs inconnus: {', '.join(unknown)}")
+    if not selected:
+        raise HTTPException(status_code=400, detail="Aucun champ sélectionné")
+    
+    query = build_product_query(category, subcategory, brand, is_bio, search, min_price, max_price)
+    projection = {"_id": 0, **{f: 1 for f in selected}}
+    # A query that can match nothing still streams an empty export
+    cursor = db.products.find(query if query is not None else {"_id": None}, projection).sort("id", 1)
+    
+    stream = ndjson_stream(cursor) if format == "ndjson" else csv_stream(cursor, selected)
+    filename = f"produits-{datetime.now(timezone.utc).strftime('%Y%m%d')}.{format}"
+    return StreamingResponse(
+        stream,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @api_router.post("/admin/products", response_model=Product)
 async def admin_create_product(product_data: CreateProduct, user: User = Depends(require_admin)):
@@ -829,8 +1254,37 @@ async def admin_create_product(product_data: CreateProduct, user: User = Depends
     )
     
     await db.products.insert_one(product.model_dump())
+    catalog.invalidate()
     return product
 
+@api_router.post("/admin/products/import")
+async def admin_import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    user: User = Depends(require_admin)
+):
+    """Create or update products in bulk from a CSV or NDJSON file (admin only).
+    
+    Products are matched by slug; invalid rows are reported and skipped.
+    """
+    # Format from the file extension unless given
+    format = format or Path(file.filename or "").suffix.lstrip('.').lower()
+    if format == "jsonl":
+        format = "ndjson"
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format invalide (csv ou ndjson)")
+    
+    try:
+        report = await import_products(db, file.file, format, CreateProduct)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Fichier illisible: {e}")
+    finally:
+        await file.close()
+    
+    if report['inserted'] or report['updated']:
+        catalog.invalidate()
+    return report
+
 @api_router.put("/admin/products/{product_id}", response_model=Product)
 async def admin_update_product(
     product_id: str, 
@@ -851,6 +1305,7 @@ async def admin_update_product(
             {"id": product_id},
             {"$set": update_data}
         )
+        catalog.invalidate()
     
     # Return updated product
     updated = await db.products.find_one({"id": product_id}, {"_id": 0})
@@ -862,50 +1317,105 @@ async def admin_delete_product(product_id: str, user: User = Depends(require_adm
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
+    catalog.invalidate()
     return {"message": "Produit supprimé avec succès"}
 
 @api_router.get("/admin/stats")
 async def admin_get_stats(user: User = Depends(require_admin)):
     """Get admin dashboard statistics"""
-    products_count = await db.products.count_documents({})
-    users_count = await db.users.count_documents({})
-    orders_count = await db.orders.count_documents({})
-    
-    # Total revenue
-    orders = await db.orders.find({"status": "paid"}, {"_id": 0, "total_amount": 1}).to_list(10000)
-    total_revenue = sum(order['total_amount'] for order in orders)
-    
-    # Products by category
-    pipeline = [
-        {"$group": {"_id": "$category", "count": {"$sum": 1}}}
-    ]
-    products_by_category = await db.products.aggregate(pipeline).to_list(100)
+    # Collection counts come from metadata and revenue from the sales
+    # rollup, so this stays constant-time as orders grow
+    products_count, users_count, orders_count, totals, products_by_category = await asyncio.gather(
+        db.products.estimated_document_count(),
+        db.users.estimated_document_count(),
+        db.orders.estimated_document_count(),
+        get_totals(db),
+        db.products.aggregate([{"$group": {"_id": "$category", "count": {"$sum": 1}}}]).to_list(100)
+    )
+    total_revenue = round(totals['revenue'], 2)
     
     return {
         "products_count": products_count,
         "users_count": users_count,
         "orders_count": orders_count,
         "total_revenue": total_revenue,
+        "paid_orders_count": totals['paid_orders'],
         "products_by_category": products_by_category
     }
 
+@api_router.get("/admin/analytics/sales")
+async def admin_get_sales_analytics(
+    granularity: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    breakdown: bool = False,
+    user: User = Depends(require_admin)
+):
+    """Revenue, orders and units over time from the sales rollups (admin only)"""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Granularité invalide")
+    
+    end = end or datetime.now(timezone.utc)
+    start = start or end - (timedelta(days=30) if granularity == "day" else timedelta(hours=48))
+    buckets = await get_sales_series(db, granularity, start, end, breakdown=breakdown)
+    
+    return {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "totals": {
+            "revenue": round(sum(b['revenue'] for b in buckets), 2),
+            "orders": sum(b['orders'] for b in buckets),
+            "units": sum(b['units'] for b in buckets)
+        },
+        "buckets": buckets
+    }
+
+@api_router.get("/admin/cache/sessions")
+async def admin_get_session_cache_stats(user: User = Depends(require_admin)):
+    """Get session cache hit/miss counters (admin only)"""
+    return session_cache.stats()
+
+@api_router.get("/admin/payments/metrics")
+async def admin_get_payment_metrics(user: User = Depends(require_admin)):
+    """Get payment provider call latencies (admin only)"""
+    return {"provider": payment_provider.name, "operations": payment_provider.metrics.summary()}
+
+@api_router.get("/admin/jobs")
+async def admin_get_jobs(user: User = Depends(require_admin)):
+    """Get background job counts by status (admin only)"""
+    return await jobs.stats()
+
 # ============= Contact Route =============
 
 @api_router.post("/contact")
 async def contact(message: ContactMessage):
-    # In production, send email or save to database
-    logging.info(f"Contact message from {message.email}: {message.subject}")
+    await jobs.enqueue("contact_message", message.model_dump())
     return {"message": "Message envoyé avec succès"}
 
+@jobs.handler("contact_message")
+async def contact_message_job(payload: Dict[str, Any]):
+    # In production, send email as well
+    await db.contact_messages.insert_one({**payload, "created_at": datetime.now(timezone.utc)})
+    logging.info(f"Contact message from {payload['email']}: {payload['subject']}")
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# ETag / conditional GET for catalog endpoints, keyed on the catalog version
+app.middleware("http")(ConditionalGetCache(
+    version=lambda: catalog.version,
+    ttl=float(os.environ.get('CATALOG_SNAPSHOT_MAX_AGE', '30')),
+    max_age=int(os.environ.get('CATALOG_CACHE_MAX_AGE', '0'))
+))
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # Configure logging
@@ -915,6 +1425,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_http_client():
+    await http_client.start()
+
+@app.on_event("startup")
+async def backfill_sales_rollups():
+    # Counts the orders paid before the rollups existed, once per rollups
+    # version, before the job workers start recording new ones
+    result = await ensure_backfilled(db)
+    if result is not None:
+        logger.info(f"Sales rollups backfilled: {result['buckets']} buckets, {result['paid_orders']} paid orders")
+
+@app.on_event("startup")
+async def start_job_workers():
+    jobs.start()
+
+@app.on_event("startup")
+async def create_db_indexes():
+    await ensure_indexes(db)
+    drift = await index_drift(db)
+    for collection, diff in drift.items():
+        logger.warning(f"Index drift on {collection}: {diff}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await jobs.stop()
     client.close()
+    password_hasher.shutdown()
+    await http_client.close()
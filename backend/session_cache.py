@@ -0,0 +1,65 @@
+"""In-process cache of session token -> resolved user.
+
+Saves the two round trips (`user_sessions` then `users`) that every
+authenticated request otherwise pays. Entries are bounded in number (LRU)
+and in age (TTL) and never outlive the session's own `expires_at`.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+
+class SessionCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Any]:
+        """Return the cached user for a token, or None on miss/expiry.
+
+        The returned object is shared between requests and must not be mutated.
+        """
+        entry = self._cache.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        user, expires_at = entry
+        if expires_at < datetime.now(timezone.utc):
+            self.invalidate_token(token)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return user
+
+    def set(self, token: str, user: Any, expires_at: datetime):
+        self._cache[token] = (user, expires_at)
+
+    def invalidate_token(self, token: str):
+        self._cache.pop(token, None)
+
+    def invalidate_user(self, user_id: str):
+        """Forget every session of a user, e.g. after the user document changed.
+
+        Scans the cache (at most `maxsize` entries): this is rare, and a
+        per-user index would have to follow every LRU/TTL eviction.
+        """
+        for token in [t for t, (user, _) in self._cache.items() if user.id == user_id]:
+            self._cache.pop(token, None)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl": self._cache.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,114 @@
+"""Lifecycle of `user_sessions` documents.
+
+Sessions expire through a TTL index on `expires_at` (see indexes.py), so
+`expires_at` must be stored as a BSON date: MongoDB never expires string
+values, and only dates compare correctly in the token lookup. Each user
+keeps at most `max_per_user` sessions; creating one more drops the oldest.
+
+Sessions written before this lifecycle existed (string dates, expired
+documents piling up, users over the cap) are cleaned up by:
+
+    python sessions.py --max-per-user 10
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+SESSION_DURATION = timedelta(days=7)
+
+
+def as_utc(value) -> datetime:
+    """Timezone-aware UTC datetime from a stored date (naive UTC) or ISO string"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+async def find_active(db, token: str) -> Optional[Dict[str, Any]]:
+    """Session for a token, if it has not expired yet.
+
+    The TTL monitor only runs every minute, so expiry is also checked here.
+    """
+    session = await db.user_sessions.find_one(
+        {"session_token": token, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+    )
+    if session is not None:
+        session['expires_at'] = as_utc(session['expires_at'])
+    return session
+
+
+async def trim_sessions(db, user_id: str, keep: int) -> List[str]:
+    """Delete a user's sessions beyond the `keep` most recent; returns their tokens"""
+    stale = await db.user_sessions.find(
+        {"user_id": user_id}, {"_id": 0, "session_token": 1}
+    ).sort([("created_at", -1), ("_id", -1)]).skip(keep).to_list(None)
+    tokens = [s['session_token'] for s in stale]
+    if tokens:
+        await db.user_sessions.delete_many({"session_token": {"$in": tokens}})
+    return tokens
+
+
+async def store_session(db, session: Dict[str, Any], max_per_user: int) -> List[str]:
+    """Insert a session and enforce the per-user cap; returns the evicted tokens"""
+    await db.user_sessions.insert_one(dict(session))
+    return await trim_sessions(db, session['user_id'], max_per_user)
+
+
+async def migrate(db, max_per_user: int, batch_size: int = 1000) -> Dict[str, int]:
+    """Convert string dates, delete expired sessions and apply the per-user cap"""
+    converted = 0
+    ops = []
+    async for session in db.user_sessions.find({"expires_at": {"$type": "string"}}, {"_id": 1, "expires_at": 1}):
+        ops.append(UpdateOne({"_id": session["_id"]}, {"$set": {"expires_at": as_utc(session["expires_at"])}}))
+        if len(ops) == batch_size:
+            converted += (await db.user_sessions.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        converted += (await db.user_sessions.bulk_write(ops, ordered=False)).modified_count
+
+    expired = await db.user_sessions.delete_many({"expires_at": {"$lte": datetime.now(timezone.utc)}})
+
+    trimmed = 0
+    over_cap = db.user_sessions.aggregate([
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": max_per_user}}}
+    ])
+    async for row in over_cap:
+        trimmed += len(await trim_sessions(db, row["_id"], max_per_user))
+
+    # Superseded by the (user_id, created_at) index
+    if "user_id" in await db.user_sessions.index_information():
+        await db.user_sessions.drop_index("user_id")
+
+    return {"converted": converted, "expired": expired.deleted_count, "trimmed": trimmed}
+
+
+async def main(max_per_user: int):
+    load_dotenv(Path(__file__).parent / '.env')
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from indexes import ensure_indexes
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        result = await migrate(db, max_per_user)
+        print(f"{result['converted']} dates converted, {result['expired']} expired and {result['trimmed']} excess sessions deleted")
+        # The TTL index takes over from here
+        await ensure_indexes(db)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean up stored user sessions")
+    parser.add_argument("--max-per-user", type=int, default=int(os.environ.get('MAX_SESSIONS_PER_USER', '10')))
+    args = parser.parse_args()
+    asyncio.run(main(args.max_per_user))
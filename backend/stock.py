@@ -0,0 +1,152 @@
+"""All-or-nothing stock commits for paid orders.
+
+Every line is a conditional decrement (`stock >= quantity`) sent in one
+`bulk_write`, so stock can never go negative. If any line cannot be
+served, the lines already applied are rolled back:
+
+- inside a transaction when the deployment supports them (replica set or
+  sharded cluster);
+- otherwise by compensation: each applied line leaves a hold marker
+  (`stock_holds.<order_id>`) that identifies exactly what to give back.
+
+The outcome is recorded on the order (`stock_committed`), in the same
+transaction or before the holds are released, so committing the same
+order again (a retried job) returns the recorded outcome instead of
+decrementing stock twice.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+_supports_transactions: Dict[int, bool] = {}
+
+
+async def supports_transactions(db) -> bool:
+    key = id(db.client)
+    if key not in _supports_transactions:
+        hello = await db.client.admin.command("hello")
+        _supports_transactions[key] = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _supports_transactions[key]
+
+
+def _quantities(items: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Total quantity per product; an order may list a product twice"""
+    quantities: Dict[str, int] = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+    return quantities
+
+
+class _InsufficientStock(Exception):
+    pass
+
+
+class _AlreadyRecorded(Exception):
+    pass
+
+
+async def _recorded(db, order_id: str) -> Optional[bool]:
+    order = await db.orders.find_one({"id": order_id}, {"_id": 0, "stock_committed": 1})
+    if order is None:
+        raise ValueError(f"Commande {order_id} introuvable")
+    return order.get("stock_committed")
+
+
+async def _record(db, order_id: str, committed: bool):
+    await db.orders.update_one(
+        {"id": order_id, "stock_committed": {"$exists": False}},
+        {"$set": {"stock_committed": committed}}
+    )
+
+
+async def _commit_in_transaction(db, order_id: str, quantities: Dict[str, int]) -> bool:
+    ops = [
+        UpdateOne({"id": product_id, "stock": {"$gte": qty}}, {"$inc": {"stock": -qty}})
+        for product_id, qty in quantities.items()
+    ]
+
+    async def apply(session):
+        marked = await db.orders.update_one(
+            {"id": order_id, "stock_committed": {"$exists": False}},
+            {"$set": {"stock_committed": True}},
+            session=session
+        )
+        if marked.modified_count != 1:
+            raise _AlreadyRecorded()
+        result = await db.products.bulk_write(ops, ordered=False, session=session)
+        if result.modified_count != len(ops):
+            raise _InsufficientStock()
+
+    async with await db.client.start_session() as session:
+        try:
+            # Retries transient write conflicts, aborts on any exception
+            await session.with_transaction(apply)
+        except _AlreadyRecorded:
+            return await _recorded(db, order_id)
+        except _InsufficientStock:
+            await _record(db, order_id, False)
+            return False
+    return True
+
+
+async def _release_holds(db, order_id: str, quantities: Dict[str, int]):
+    hold = f"stock_holds.{order_id}"
+    await db.products.update_many({"id": {"$in": list(quantities)}, hold: {"$exists": True}}, {"$unset": {hold: ""}})
+
+
+async def _commit_with_compensation(db, order_id: str, quantities: Dict[str, int]) -> bool:
+    hold = f"stock_holds.{order_id}"
+    ops = [
+        UpdateOne(
+            {"id": product_id, "stock": {"$gte": qty}, hold: {"$exists": False}},
+            {"$inc": {"stock": -qty}, "$set": {hold: qty}}
+        )
+        for product_id, qty in quantities.items()
+    ]
+    await db.products.bulk_write(ops, ordered=False)
+
+    # Lines held by an earlier attempt for this order were skipped above,
+    # so count the holds rather than this attempt's modifications
+    held = await db.products.count_documents({"id": {"$in": list(quantities)}, hold: {"$exists": True}})
+    committed = held == len(ops)
+    if not committed:
+        # Give back exactly the lines that were applied
+        await db.products.bulk_write([
+            UpdateOne({"id": product_id, hold: qty}, {"$inc": {"stock": qty}, "$unset": {hold: ""}})
+            for product_id, qty in quantities.items()
+        ], ordered=False)
+
+    # Recorded before the holds are released: from here on a retry returns
+    # the outcome instead of applying the lines again
+    await _record(db, order_id, committed)
+    if committed:
+        await _release_holds(db, order_id, quantities)
+    return committed
+
+
+async def commit_stock(db, order_id: str, items: List[Dict[str, Any]]) -> bool:
+    """Decrement stock for every line of an existing order, or for none of them.
+
+    Returns False (and leaves stock untouched) if any product lacks stock.
+    Safe to call again for the same order: the recorded outcome is returned.
+    """
+    quantities = _quantities(items)
+    if not quantities:
+        return True
+    transactions = await supports_transactions(db)
+    recorded = await _recorded(db, order_id)
+    if recorded is not None:
+        if recorded and not transactions:
+            # Holds left by an attempt interrupted after recording
+            await _release_holds(db, order_id, quantities)
+        return recorded
+    if transactions:
+        committed = await _commit_in_transaction(db, order_id, quantities)
+    else:
+        committed = await _commit_with_compensation(db, order_id, quantities)
+    if not committed:
+        logger.error(f"Stock insuffisant pour la commande {order_id}")
+    return committed
@@ -0,0 +1,155 @@
+"""Stateless authentication with signed tokens (AUTH_MODE=jwt).
+
+Access tokens are short-lived JWTs carrying the user id, name, email and
+role flags, verified in-process: an authenticated request needs no
+database query. Refresh tokens live longer and are exchanged for a new
+pair, the old refresh token becoming unusable (rotation).
+
+Both tokens of a login share a session id (`sid`). Each login has a
+`token_sessions` document holding the `jti` of its current refresh token;
+a refresh advances it with a conditional update, so presenting an older
+refresh token (a replay) is detected by the database, not by a list of
+used tokens. Logout revokes the sid: revoked sids are stored in
+`revoked_tokens` until the tokens they cover expire (TTL index), and
+mirrored in memory, each process reloading them at most every
+`sync_interval` seconds. Only logouts add to that list.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set
+
+import jwt
+from pymongo.errors import DuplicateKeyError
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+
+class RevocationList:
+    def __init__(self, db, sync_interval: float = 30.0):
+        self.db = db
+        self.sync_interval = sync_interval
+        self._revoked: Set[str] = set()
+        self._synced_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def sync(self, force: bool = False):
+        """Reload revoked ids if the local copy is older than `sync_interval`"""
+        if not force and self._synced_at is not None and time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        async with self._lock:
+            if not force and self._synced_at is not None and time.monotonic() - self._synced_at < self.sync_interval:
+                return
+            now = datetime.now(timezone.utc)
+            cursor = self.db.revoked_tokens.find({"expires_at": {"$gt": now}}, {"_id": 1})
+            self._revoked = {doc["_id"] async for doc in cursor}
+            self._synced_at = time.monotonic()
+
+    async def is_revoked(self, *ids: str) -> bool:
+        await self.sync()
+        return any(i in self._revoked for i in ids)
+
+    async def revoke(self, token_id: str, expires_at: datetime) -> bool:
+        """Revoke a sid until `expires_at`, when its tokens are dead anyway.
+
+        Returns False if it was already revoked.
+        """
+        self._revoked.add(token_id)
+        try:
+            result = await self.db.revoked_tokens.update_one(
+                {"_id": token_id},
+                {"$max": {"expires_at": expires_at}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Concurrent upsert of the same id
+            return False
+        return result.upserted_id is not None
+
+
+class TokenIssuer:
+    def __init__(
+        self,
+        db,
+        secret: str,
+        algorithm: str,
+        revocations: RevocationList,
+        access_ttl: timedelta = timedelta(minutes=15),
+        refresh_ttl: timedelta = timedelta(days=30)
+    ):
+        self.db = db
+        self.secret = secret
+        self.algorithm = algorithm
+        self.revocations = revocations
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+
+    def _encode(self, claims: Dict[str, Any], kind: str, ttl: timedelta, jti: Optional[str] = None) -> str:
+        now = datetime.now(timezone.utc)
+        payload = {**claims, "typ": kind, "jti": jti or uuid.uuid4().hex, "iat": now, "exp": now + ttl}
+        return jwt.encode(payload, self.secret, algorithm=self.algorithm)
+
+    def issue(self, user, sid: str, refresh_jti: str) -> Dict[str, Any]:
+        """Access and refresh tokens for a user; `sid` is kept across refreshes"""
+        access_claims = {
+            "sub": user.id,
+            "sid": sid,
+            "email": user.email,
+            "name": user.name,
+            "adm": user.is_admin,
+            "pro": user.is_professional
+        }
+        return {
+            "access_token": self._encode(access_claims, ACCESS, self.access_ttl),
+            "refresh_token": self._encode({"sub": user.id, "sid": sid}, REFRESH, self.refresh_ttl, jti=refresh_jti),
+            "expires_in": int(self.access_ttl.total_seconds())
+        }
+
+    def decode(self, token: str, kind: str) -> Optional[Dict[str, Any]]:
+        """Claims of a correctly signed, unexpired token of the given kind, else None"""
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except jwt.PyJWTError:
+            return None
+        return claims if claims.get("typ") == kind else None
+
+    async def verify(self, token: str, kind: str = ACCESS) -> Optional[Dict[str, Any]]:
+        """Like `decode`, also rejecting tokens of logged out sessions"""
+        claims = self.decode(token, kind)
+        if claims is None or await self.revocations.is_revoked(claims["sid"]):
+            return None
+        return claims
+
+    async def login(self, user) -> Dict[str, Any]:
+        """Tokens for a new login"""
+        sid, refresh_jti = uuid.uuid4().hex, uuid.uuid4().hex
+        await self.db.token_sessions.insert_one({
+            "_id": sid,
+            "user_id": user.id,
+            "refresh_jti": refresh_jti,
+            "expires_at": datetime.now(timezone.utc) + self.refresh_ttl
+        })
+        return self.issue(user, sid, refresh_jti)
+
+    async def rotate(self, claims: Dict[str, Any], user) -> Optional[Dict[str, Any]]:
+        """New tokens for the refresh token `claims` came from.
+
+        Returns None unless it is the session's current refresh token: an
+        older one has already been exchanged, i.e. it is being replayed.
+        """
+        refresh_jti = uuid.uuid4().hex
+        result = await self.db.token_sessions.update_one(
+            {"_id": claims["sid"], "refresh_jti": claims["jti"]},
+            {"$set": {"refresh_jti": refresh_jti, "expires_at": datetime.now(timezone.utc) + self.refresh_ttl}}
+        )
+        if not result.modified_count:
+            return None
+        return self.issue(user, claims["sid"], refresh_jti)
+
+    async def revoke_session(self, claims: Dict[str, Any]):
+        """Revoke every token of the login `claims` belongs to"""
+        # Covers any refresh token issued so far in this session
+        await self.revocations.revoke(claims["sid"], datetime.now(timezone.utc) + self.refresh_ttl)
+        await self.db.token_sessions.delete_one({"_id": claims["sid"]})
@@ -0,0 +1,131 @@
+"""Durable, deduplicated payment webhook ingestion.
+
+The webhook route only verifies the event and persists it in
+`payment_events` under its event id, then acknowledges. If the event
+cannot be stored the route fails with a 5xx so the provider retries; a
+redelivered event hits the unique `_id` and is only queued again if it was
+not processed yet. Processing runs as a `payment_event` job (see jobs.py),
+which retries with backoff and marks the event `processed` once its
+handler succeeded, or `failed` while it does not. Events still `pending`
+after a grace period (the process died before queuing their job) are
+queued by a periodic sweep. Events that were never processed can be
+queued again:
+
+    python webhooks.py                        # replay unprocessed events
+    python webhooks.py --all --since 2024-06-01
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError
+
+JOB_NAME = "payment_event"
+
+
+def event_id_for(event, body: bytes) -> str:
+    """Provider event id, or a digest of the payload when there is none"""
+    return event.event_id or f"sha256:{hashlib.sha256(body).hexdigest()}"
+
+
+async def ingest_event(db, jobs, event, body: bytes) -> bool:
+    """Persist a verified event and queue its processing.
+
+    A redelivered event is queued again (its failed job retried) unless it
+    was already processed. Returns False when nothing was queued.
+    """
+    event_id = event_id_for(event, body)
+    try:
+        await db.payment_events.insert_one({
+            "_id": event_id,
+            "event_type": event.event_type,
+            "session_id": event.session_id,
+            "payment_status": event.payment_status,
+            "metadata": event.metadata,
+            "raw": body.decode('utf-8', errors='replace'),
+            "status": "pending",
+            "received_at": datetime.now(timezone.utc)
+        })
+    except DuplicateKeyError:
+        stored = await db.payment_events.find_one({"_id": event_id}, {"status": 1})
+        if stored is not None and stored["status"] == "processed":
+            return False
+    await jobs.enqueue(JOB_NAME, {"event_id": event_id}, dedupe_key=f"{JOB_NAME}:{event_id}", retry_failed=True)
+    return True
+
+
+def event_job(db, handler: Callable[[Dict[str, Any]], Awaitable[None]]):
+    """Job handler running `handler` on a stored event, then marking it processed"""
+    async def run(payload: Dict[str, Any]):
+        event = await db.payment_events.find_one({"_id": payload["event_id"]})
+        if event is None or event["status"] == "processed":
+            return
+        try:
+            await handler(event)
+        except Exception as e:
+            # The job is retried; `failed` keeps the sweep off this event
+            await db.payment_events.update_one({"_id": event["_id"]}, {"$set": {"status": "failed", "last_error": str(e)}})
+            raise
+        await db.payment_events.update_one(
+            {"_id": event["_id"]},
+            {"$set": {"status": "processed", "processed_at": datetime.now(timezone.utc)}}
+        )
+    return run
+
+
+async def requeue_pending(db, jobs, grace: float = 60.0) -> int:
+    """Queue events still pending `grace` seconds after they were received.
+
+    Catches events whose job was never created; for the others the dedupe
+    key makes this a no-op. Returns how many events were looked at.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace)
+    count = 0
+    async for event in db.payment_events.find({"status": "pending", "received_at": {"$lt": cutoff}}, {"_id": 1}):
+        await jobs.enqueue(JOB_NAME, {"event_id": event["_id"]}, dedupe_key=f"{JOB_NAME}:{event['_id']}")
+        count += 1
+    return count
+
+
+async def replay(db, jobs, include_processed: bool = False, since: Optional[datetime] = None) -> int:
+    """Queue stored events for processing again"""
+    query: Dict[str, Any] = {} if include_processed else {"status": {"$ne": "processed"}}
+    if since is not None:
+        query["received_at"] = {"$gte": since}
+
+    count = 0
+    async for event in db.payment_events.find(query, {"_id": 1}):
+        await db.payment_events.update_one({"_id": event["_id"]}, {"$set": {"status": "pending"}})
+        # Fresh job id: the original job may already be done or failed
+        await jobs.enqueue(JOB_NAME, {"event_id": event["_id"]}, dedupe_key=f"{JOB_NAME}:{event['_id']}:{uuid.uuid4()}")
+        count += 1
+    return count
+
+
+async def main(include_processed: bool, since: Optional[datetime]):
+    load_dotenv(Path(__file__).parent / '.env')
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from jobs import JobQueue
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        # Only enqueues: the server's job workers do the processing
+        count = await replay(db, JobQueue(db), include_processed, since)
+        print(f"{count} events queued for replay")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay stored payment webhook events")
+    parser.add_argument("--all", action="store_true", help="also replay already processed events")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only events received after this date")
+    args = parser.parse_args()
+    asyncio.run(main(args.all, args.since))
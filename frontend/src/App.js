@@ -5,6 +5,7 @@ import axios from 'axios';
 import { Toaster } from '@/components/ui/sonner';
 import useTarteaucitron from '@/hooks/useTarteaucitron';
 import { AuthContext } from '@/contexts/AuthContext';
+import { installAuthRefresh } from '@/lib/authRefresh';
 
 // Pages
 import HomePage from '@/pages/HomePage';
@@ -28,6 +29,8 @@ import AdminProductsPage from '@/pages/AdminProductsPage';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+installAuthRefresh(API);
+
 function App() {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -0,0 +1,37 @@
+import axios from 'axios';
+
+// With AUTH_MODE=jwt the access token cookie only lasts a few minutes.
+// A request rejected with 401 exchanges the refresh token cookie for a new
+// pair, then is sent again once. In session mode /auth/refresh answers 404
+// and the original 401 is returned unchanged.
+let refreshing = null;
+
+export function installAuthRefresh(api) {
+  const refreshUrl = `${api}/auth/refresh`;
+
+  axios.interceptors.response.use(undefined, async (error) => {
+    const config = error.config;
+    // Login/logout/refresh failures are final; /auth/me is how the app
+    // finds out whether the user is still logged in
+    const isAuthCall = config?.url?.startsWith(`${api}/auth/`) && config.url !== `${api}/auth/me`;
+    if (error.response?.status !== 401 || !config || config._retried || isAuthCall) {
+      return Promise.reject(error);
+    }
+
+    // Concurrent 401s share one refresh: a refresh token is single-use and
+    // replaying it ends the session
+    if (!refreshing) {
+      refreshing = axios
+        .post(refreshUrl, undefined, { withCredentials: true })
+        .finally(() => {
+          refreshing = null;
+        });
+    }
+    try {
+      await refreshing;
+    } catch (e) {
+      return Promise.reject(error);
+    }
+    return axios({ ...config, _retried: true });
+  });
+}
@@ -0,0 +1,26 @@
+from catalog import CatalogSnapshot
+
+BOUNDARIES = [0, 20, 50, 100, 200, 500]
+
+
+def product(i, price):
+    return {
+        "id": f"p{i}", "slug": f"p{i}", "price": price, "stock": 1,
+        "category": "c", "subcategory": "s", "brand": "b",
+    }
+
+
+def test_price_facet_buckets_out_of_range_prices_apart():
+    prices = [0, 19.99, 20, 499, 500, 10_000, -1, None, float("inf")]
+    products = [product(i, price) for i, price in enumerate(prices)]
+    del products[-2]["price"]
+
+    facet = CatalogSnapshot(products).facets(BOUNDARIES)["facets"]["price"]
+
+    assert facet == [
+        {"min": 0, "max": 20, "count": 2},
+        {"min": 20, "max": 50, "count": 1},
+        {"min": 200, "max": 500, "count": 1},
+        {"min": 500, "max": None, "count": 2},
+        {"min": None, "max": None, "count": 3},
+    ]
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import decode_cursor, encode_cursor, keyset_filter, next_cursor
+
+
+def matches(doc, condition):
+    """Evaluate the subset of MongoDB queries keyset_filter produces.
+
+    As in MongoDB, range operators never match a missing/None value.
+    """
+    if "$or" in condition:
+        return any(matches(doc, branch) for branch in condition["$or"])
+    for field, expected in condition.items():
+        value = doc.get(field)
+        if not isinstance(expected, dict):
+            if value != expected:
+                return False
+            continue
+        for op, operand in expected.items():
+            if op == "$ne":
+                ok = value != operand
+            elif value is None:
+                ok = False
+            elif op == "$gt":
+                ok = value > operand
+            elif op == "$lt":
+                ok = value < operand
+            else:
+                raise AssertionError(f"unexpected operator {op}")
+            if not ok:
+                return False
+    return True
+
+
+def sort_docs(docs, field, direction):
+    """MongoDB order on (field, id): None sorts before any value"""
+    ordered = sorted(docs, key=lambda d: (d.get(field) is not None, d.get(field) or 0, d["id"]))
+    return ordered if direction == 1 else ordered[::-1]
+
+
+def paginate(docs, field, direction, limit):
+    pages, cursor = [], None
+    while True:
+        candidates = [d for d in docs if cursor is None or matches(d, keyset_filter(field, direction, cursor))]
+        page = sort_docs(candidates, field, direction)[:limit]
+        if page:
+            pages.append(page)
+        cursor = next_cursor(page, field, limit)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("value", [12.5, 0, "abc", None, True])
+def test_cursor_round_trip(value):
+    assert decode_cursor(encode_cursor(value, "id-1")) == (value, "id-1")
+
+
+def test_cursor_datetime_round_trip_is_utc():
+    naive = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    assert decode_cursor(encode_cursor(naive, "a")) == (naive.replace(tzinfo=timezone.utc), "a")
+
+    aware = datetime(2024, 5, 1, 14, 0, tzinfo=timezone(timedelta(hours=2)))
+    value, _ = decode_cursor(encode_cursor(aware, "a"))
+    assert value == aware
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor("é/+?&=", "id/with+chars")
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor!", "e30", "WzFd", "W3siJHgiOjF9LCJhIl0"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_next_cursor_only_on_full_pages():
+    docs = [{"id": "a", "price": 1.0}, {"id": "b", "price": 2.0}]
+    assert next_cursor(docs, "price", 3) is None
+    assert next_cursor([], "price", 0) is None
+    assert decode_cursor(next_cursor(docs, "price", 2)) == (2.0, "b")
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_ties_split_across_pages(direction, limit):
+    # Runs of equal prices longer than a page, and products without a price
+    prices = [5.0, 5.0, 5.0, 5.0, 1.0, 1.0, None, None, 9.5, 5.0, None, 1.0]
+    docs = [{"id": f"p{i:02d}", "price": price} for i, price in enumerate(prices)]
+
+    pages = paginate(docs, "price", direction, limit)
+    flat = [doc["id"] for page in pages for doc in page]
+
+    assert flat == [doc["id"] for doc in sort_docs(docs, "price", direction)]
+    assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_ties_on_dates_newest_first():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    # Reviews posted in the same second share created_at
+    docs = [{"id": f"r{i}", "created_at": start + timedelta(seconds=i // 4)} for i in range(10)]
+
+    pages = paginate(docs, "created_at", -1, 3)
+
+    assert [doc["id"] for page in pages for doc in page] == ["r9", "r8", "r7", "r6", "r5", "r4", "r3", "r2", "r1", "r0"]
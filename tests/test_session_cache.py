@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from session_cache import SessionCache
+
+
+def user(user_id):
+    return SimpleNamespace(id=user_id)
+
+
+def later(**kwargs):
+    return datetime.now(timezone.utc) + timedelta(**kwargs)
+
+
+def test_hit_and_miss():
+    cache = SessionCache()
+    cache.set("t1", user("u1"), later(hours=1))
+
+    assert cache.get("t1").id == "u1"
+    assert cache.get("t2") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_session_expiry_is_honored():
+    cache = SessionCache(ttl=60)
+    cache.set("t1", user("u1"), later(seconds=-1))
+
+    assert cache.get("t1") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_user_drops_only_that_users_tokens():
+    cache = SessionCache()
+    cache.set("a1", user("a"), later(hours=1))
+    cache.set("a2", user("a"), later(hours=1))
+    cache.set("b1", user("b"), later(hours=1))
+
+    cache.invalidate_user("a")
+
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.get("b1").id == "b"
+
+
+def test_evicted_entries_leave_nothing_behind():
+    cache = SessionCache(maxsize=100, ttl=0.01)
+    for i in range(5000):
+        cache.set(f"t{i}", user(f"u{i}"), later(hours=1))
+    time.sleep(0.02)
+    cache.set("last", user("last"), later(hours=1))
+
+    # Only the live entry remains, whatever was evicted by LRU or TTL
+    assert cache.stats()["size"] == 1
+    cache.invalidate_user("u4999")
+    assert cache.get("last").id == "last"
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import stock
+from stock import commit_stock
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db(monkeypatch):
+    # mongomock has no sessions: these tests cover the compensation path
+    async def no_transactions(db):
+        return False
+    monkeypatch.setattr(stock, "supports_transactions", no_transactions)
+
+    db = AsyncMongoMockClient()["stock_tests"]
+    await db.products.insert_many([
+        {"id": "a", "stock": 10},
+        {"id": "b", "stock": 3},
+    ])
+    await db.orders.insert_many([{"id": f"o{i}"} for i in range(20)])
+    return db
+
+
+async def stocks(db):
+    return {p["id"]: p["stock"] async for p in db.products.find()}
+
+
+async def holds(db):
+    return await db.products.count_documents({"stock_holds": {"$exists": True, "$ne": {}}})
+
+
+async def recorded(db, order_id):
+    return (await db.orders.find_one({"id": order_id})).get("stock_committed")
+
+
+async def test_commits_every_line(db):
+    assert await commit_stock(db, "o0", [{"product_id": "a", "quantity": 4}, {"product_id": "b", "quantity": 3}])
+
+    assert await stocks(db) == {"a": 6, "b": 0}
+    assert await recorded(db, "o0") is True
+    assert await holds(db) == 0
+
+
+async def test_insufficient_line_commits_nothing(db):
+    assert not await commit_stock(db, "o0", [{"product_id": "a", "quantity": 4}, {"product_id": "b", "quantity": 4}])
+
+    assert await stocks(db) == {"a": 10, "b": 3}
+    assert await recorded(db, "o0") is False
+    assert await holds(db) == 0
+
+
+async def test_repeated_product_lines_are_summed(db):
+    assert not await commit_stock(db, "o0", [{"product_id": "b", "quantity": 2}, {"product_id": "b", "quantity": 2}])
+    assert await stocks(db) == {"a": 10, "b": 3}
+
+
+async def test_retry_returns_recorded_outcome(db):
+    items = [{"product_id": "a", "quantity": 4}]
+    assert await commit_stock(db, "o0", items)
+    assert await commit_stock(db, "o0", items)
+    assert await stocks(db) == {"a": 6, "b": 3}
+
+    await db.products.update_one({"id": "b"}, {"$set": {"stock": 0}})
+    assert not await commit_stock(db, "o1", [{"product_id": "b", "quantity": 1}])
+    await db.products.update_one({"id": "b"}, {"$set": {"stock": 5}})
+    # Stock came back, but the order was already refused
+    assert not await commit_stock(db, "o1", [{"product_id": "b", "quantity": 1}])
+    assert await stocks(db) == {"a": 6, "b": 5}
+
+
+async def test_retry_after_crash_with_lines_held(db):
+    # An attempt died after applying line "a" but before line "b" and the record
+    await db.products.update_one({"id": "a"}, {"$inc": {"stock": -4}, "$set": {"stock_holds.o0": 4}})
+
+    assert await commit_stock(db, "o0", [{"product_id": "a", "quantity": 4}, {"product_id": "b", "quantity": 1}])
+
+    assert await stocks(db) == {"a": 6, "b": 2}
+    assert await holds(db) == 0
+
+
+async def test_retry_after_crash_rolls_back_held_lines(db):
+    await db.products.update_one({"id": "a"}, {"$inc": {"stock": -4}, "$set": {"stock_holds.o0": 4}})
+
+    assert not await commit_stock(db, "o0", [{"product_id": "a", "quantity": 4}, {"product_id": "b", "quantity": 5}])
+
+    assert await stocks(db) == {"a": 10, "b": 3}
+    assert await holds(db) == 0
+
+
+async def test_retry_releases_holds_left_after_recording(db):
+    await db.products.update_many({}, {"$inc": {"stock": -1}, "$set": {"stock_holds.o0": 1}})
+    await db.orders.update_one({"id": "o0"}, {"$set": {"stock_committed": True}})
+
+    assert await commit_stock(db, "o0", [{"product_id": "a", "quantity": 1}, {"product_id": "b", "quantity": 1}])
+
+    assert await stocks(db) == {"a": 9, "b": 2}
+    assert await holds(db) == 0
+
+
+async def test_release_is_scoped_to_the_order(db):
+    await db.products.update_one({"id": "b"}, {"$inc": {"stock": -1}, "$set": {"stock_holds.o1": 1}})
+
+    assert await commit_stock(db, "o0", [{"product_id": "a", "quantity": 1}, {"product_id": "b", "quantity": 1}])
+
+    product = await db.products.find_one({"id": "b"})
+    assert product["stock_holds"] == {"o1": 1}
+
+
+async def test_concurrent_orders_never_oversell(db):
+    results = await asyncio.gather(*(
+        commit_stock(db, f"o{i}", [{"product_id": "a", "quantity": 1}, {"product_id": "b", "quantity": 1}])
+        for i in range(20)
+    ))
+
+    assert sum(results) == 3
+    assert await stocks(db) == {"a": 7, "b": 0}
+    assert await holds(db) == 0
+
+
+async def test_unknown_order_is_an_error(db):
+    with pytest.raises(ValueError):
+        await commit_stock(db, "missing", [{"product_id": "a", "quantity": 1}])